@@ -1,15 +1,30 @@
 import re
 
 import attr
+from typing import Dict, FrozenSet
 
+from requirements import get_mask
 
-@attr.s(eq=True)
+
+# Flyweight tables. There are few distinct types, but they are referenced all over the model.
+_interned_types = {}  # type: Dict[BasicType, BasicType]
+_types_by_class = {}  # type: Dict[type, BasicType]
+_types_by_definition = {}  # type: Dict[str, BasicType]
+
+
+@attr.s(eq=True, frozen=True, slots=True)
 class BasicType(object):
     name = attr.ib()  # type: str
     module = attr.ib()  # type: str
     is_array = attr.ib(default=False)  # type: bool
     is_iterator = attr.ib(default=False)  # type: bool
 
+    # Derived from the fields above, and computed once on construction.
+    qualified_name = attr.ib(init=False, eq=False, repr=False)  # type: str
+    proper_name = attr.ib(init=False, eq=False, repr=False)  # type: str
+    requires = attr.ib(init=False, eq=False, repr=False)  # type: FrozenSet
+    requires_mask = attr.ib(init=False, eq=False, repr=False)  # type: int
+
     REPLACEMENTS = {
         'boolean': 'bool',
         'java.lang.String': 'unicode',
@@ -39,44 +54,62 @@ class BasicType(object):
         'java.lang.Float': 'float',
     }
 
-    @property
-    def qualified_name(self):
+    def __attrs_post_init__(self):
+        qualified_name = self._get_qualified_name()
+        object.__setattr__(self, 'qualified_name', qualified_name)
+        proper_name = self._get_proper_name(qualified_name)
+        object.__setattr__(self, 'proper_name', proper_name)
+        requires = self._get_requires(proper_name)
+        object.__setattr__(self, 'requires', requires)
+        object.__setattr__(self, 'requires_mask', get_mask(requires))
+
+    def _get_qualified_name(self):
         if self.is_builtin:
             return self.name
 
         return '{self.module}.{self.name}'.format(self=self)
 
-    @property
-    def proper_name(self):
-        name = self.REPLACEMENTS.get(self.qualified_name, self.qualified_name)
+    def _get_proper_name(self, qualified_name):
+        name = self.REPLACEMENTS.get(qualified_name, qualified_name)
         if self.is_array:
             return 'List[{}]'.format(name)
         elif self.is_iterator:
             return 'Iterator[{}]'.format(name)
         return name
 
-    @property
-    def requires(self):
+    def _get_requires(self, proper_name):
         requires = set()
 
         if self.is_array:
             requires.add(('typing', 'List'))
         if self.is_iterator:
             requires.add(('typing', 'Iterator'))
-        if '.' in self.proper_name and not self.is_builtin:
+        if '.' in proper_name and not self.is_builtin:
             requires.add(self.module)
 
-        return requires
+        return frozenset(requires)
 
     @property
     def is_builtin(self):
         return self.module == str.__module__
 
+    @property
+    def overload_key(self):
+        # type: () -> str
+        """A key that is equal for types matched by `is_overload_match`.
+
+        Reflected types never carry type arguments,
+        so a documented `Iterator<T>` is keyed as a raw `java.util.Iterator`.
+        """
+        if self.is_iterator:
+            return 'java.util.Iterator'
+        return self.proper_name
+
     def is_overload_match(self, other):
         if not isinstance(other, BasicType):
             return False
 
-        if self == other:
+        if self is other or self == other:
             return True
 
         if self.proper_name == other.proper_name:
@@ -87,8 +120,22 @@ class BasicType(object):
 
         return False
 
+    @staticmethod
+    def intern(basic_type):
+        # type: (BasicType) -> BasicType
+        return _interned_types.setdefault(basic_type, basic_type)
+
     @staticmethod
     def from_type(t):
+        # type: (type) -> BasicType
+        basic_type = _types_by_class.get(t)
+        if basic_type is None:
+            basic_type = BasicType._parse_type(t)
+            _types_by_class[t] = basic_type
+        return basic_type
+
+    @staticmethod
+    def _parse_type(t):
         # type: (type) -> BasicType
         is_array = t.__module__.startswith('[') or t.__name__.startswith('[')
         name = t.__name__.lstrip('[').rstrip(';').replace('$', '.')
@@ -97,10 +144,19 @@ class BasicType(object):
             is_array = True
             name = 'object'
             module = str.__module__
-        return BasicType(name=name, module=module, is_array=is_array)
+        return BasicType.intern(BasicType(name=name, module=module, is_array=is_array))
 
     @staticmethod
     def from_java(definition):
+        # type: (str) -> BasicType
+        basic_type = _types_by_definition.get(definition)
+        if basic_type is None:
+            basic_type = BasicType._parse_java(definition)
+            _types_by_definition[definition] = basic_type
+        return basic_type
+
+    @staticmethod
+    def _parse_java(definition):
         # type: (str) -> BasicType
         match = re.match(r'((?P<template>[\w.]+)<)?(?P<type>[\w.]+)(?P<array>\[\])?>?', definition)
         if match is None:
@@ -135,4 +191,4 @@ class BasicType(object):
         basic_type = BasicType(name=str(name), module=str(module), is_array=is_array, is_iterator=is_iterator)
         if basic_type.proper_name == '.void':
             print(basic_type)
-        return basic_type
+        return BasicType.intern(basic_type)
@@ -0,0 +1,216 @@
+"""Synthetic jsondoc corpora and model trees, shaped like the Ghidra API.
+
+Classes are generated on demand from their index, so a corpus of any size
+costs no memory until it is read.
+Classes form inheritance chains of `depth` classes, and the root of every chain
+implements some earlier roots, as interfaces.
+Method names are drawn from a shared pool, so subclasses override and overload their ancestors.
+"""
+import json
+import random
+
+from typing import Iterator
+
+from basic_type import BasicType
+from type_extractor import Class, Field, Modifier, Overload, OverloadSet, Package, Property
+
+CLASSES_PER_PACKAGE = 50
+MAX_INTERFACES = 2
+INTERFACE_POOL = 32
+
+METHOD_NAMES = [
+    '{}{}'.format(verb, noun)
+    for verb in ('get', 'set', 'is', 'add', 'remove', 'find', 'create', 'apply')
+    for noun in ('Address', 'Name', 'Value', 'Symbol', 'Range', 'Listing')
+]
+PRIMITIVES = ['int', 'long', 'boolean', 'byte', 'short', 'char', 'float', 'double']
+JAVA_TYPES = ['java.lang.String', 'java.lang.Object', 'java.math.BigInteger', 'java.lang.Integer']
+
+
+class SyntheticCorpus(object):
+    def __init__(self, size, depth=8, methods=12, seed=0):
+        # type: (int, int, int, int) -> None
+        self.size = size
+        self.depth = max(depth, 1)
+        self.methods = methods
+        self.seed = seed
+
+    def class_name(self, index):
+        # type: (int) -> str
+        return 'ghidra.bench.p{}.C{}'.format(index // CLASSES_PER_PACKAGE, index)
+
+    @property
+    def class_names(self):
+        return [self.class_name(index) for index in range(self.size)]
+
+    @property
+    def package_count(self):
+        return (self.size + CLASSES_PER_PACKAGE - 1) // CLASSES_PER_PACKAGE
+
+    def _random(self, index):
+        return random.Random(self.seed * 1000003 + index)
+
+    def _random_type(self, rng, returnable=False):
+        roll = rng.random()
+        if returnable and roll < 0.15:
+            return 'void'
+        if roll < 0.4:
+            return rng.choice(PRIMITIVES)
+        if roll < 0.55:
+            return rng.choice(JAVA_TYPES)
+
+        class_name = self.class_name(rng.randrange(self.size))
+        if roll < 0.65:
+            return 'java.util.List<{}>'.format(class_name)
+        if roll < 0.7:
+            return 'java.util.Iterator<{}>'.format(class_name)
+        if roll < 0.78:
+            return '{}[]'.format(class_name)
+        return class_name
+
+    def _method(self, rng, name):
+        params = [
+            {
+                'name': 'arg{}'.format(i),
+                'type_long': self._random_type(rng),
+                'comment': 'A parameter.',
+            }
+            for i in range(rng.randrange(5))
+        ]
+        return {
+            'name': name,
+            'comment': 'Comment of {}.'.format(name),
+            'javadoc': 'Javadoc of {}.\n@return the result'.format(name),
+            'static': rng.random() < 0.1,
+            'params': params,
+            'return': {'type_long': self._random_type(rng, returnable=True), 'comment': ''},
+        }
+
+    def get(self, index):
+        # type: (int) -> dict
+        """The jsondoc of a class."""
+        rng = self._random(index)
+
+        methods = []
+        for _ in range(self.methods):
+            name = rng.choice(METHOD_NAMES)
+            for _overload in range(1 + int(rng.random() < 0.3) + int(rng.random() < 0.1)):
+                methods.append(self._method(rng, name))
+        for _ in range(rng.randrange(1, 3)):
+            methods.append(self._method(rng, '<init>'))
+
+        jsondoc = {
+            'name': self.class_name(index).rpartition('.')[-1],
+            'comment': 'Synthetic class number {}.'.format(index),
+            'methods': methods,
+        }
+
+        if index % self.depth:
+            jsondoc['extends'] = self.class_name(index - 1)
+        else:
+            roots = [root for root in range(0, min(index, INTERFACE_POOL * self.depth), self.depth)]
+            jsondoc['implements'] = [
+                self.class_name(root)
+                for root in rng.sample(roots, min(len(roots), rng.randrange(MAX_INTERFACES + 1)))
+            ]
+
+        return jsondoc
+
+    def iter_type_definitions(self):
+        """Every type reference of the corpus, as written in the jsondoc."""
+        for index in range(self.size):
+            for method in self.get(index)['methods']:
+                for param in method['params']:
+                    yield param['type_long']
+                yield method['return']['type_long']
+
+
+class SyntheticJsonDocSource(object):
+    """A jsondoc source over a synthetic corpus, with the interface of the sources in `helper`."""
+
+    def __init__(self, corpus):
+        # type: (SyntheticCorpus) -> None
+        self.corpus = corpus
+        self._indices = dict((name, index) for index, name in enumerate(corpus.class_names))
+
+    @property
+    def class_names(self):
+        return self.corpus.class_names
+
+    def read(self, class_name):
+        index = self._indices.get(class_name)
+        if index is None:
+            return None
+        return json.dumps(self.corpus.get(index)).encode('ascii')
+
+    def get(self, class_name):
+        index = self._indices.get(class_name)
+        if index is None:
+            return None
+        return self.corpus.get(index)
+
+    def close(self):
+        pass
+
+
+def make_overload(method):
+    argument_types = [BasicType.from_java(param['type_long']) for param in method['params']]
+    return Overload(
+        return_type=BasicType.from_java(method['return']['type_long']),
+        argument_types=argument_types,
+        argument_names=[param['name'] for param in method['params']],
+        is_static=method['static'],
+        docstring=method['javadoc'],
+    )
+
+
+def make_class(corpus, index):
+    # type: (SyntheticCorpus, int) -> Class
+    """The model a class extracted with docs would have."""
+    jsondoc = corpus.get(index)
+
+    overloads = {}
+    for method in jsondoc['methods']:
+        overloads.setdefault(method['name'], []).append(make_overload(method))
+    constructors = overloads.pop('<init>', [])
+
+    if 'extends' in jsondoc:
+        bases = [BasicType.from_java(jsondoc['extends'])]
+    else:
+        bases = [BasicType.from_java('java.lang.Object')]
+        bases.extend(BasicType.from_java(interface) for interface in jsondoc['implements'])
+
+    return Class(
+        name=jsondoc['name'],
+        methods=[OverloadSet(name=name, overloads=overloads[name]) for name in sorted(overloads)],
+        constructors=[OverloadSet(name='__init__', overloads=constructors, is_constructor=True)],
+        properties=[
+            Property(name='value', getter_type=BasicType.from_java('int'),
+                     setter_type=BasicType.from_java('int')),
+            Property(name='name', getter_type=BasicType.from_java('java.lang.String'),
+                     setter_type=None),
+        ],
+        fields=[
+            Field(name='COUNT', my_type=BasicType.from_java('int'), modifiers=Modifier(0x18),
+                  value_repr=str(index), has_value=True),
+            Field(name='cache', my_type=BasicType.from_java('java.lang.Object'),
+                  modifiers=Modifier(0), value_repr=None, has_value=False),
+        ],
+        nested_classes=[],
+        is_iterable=index % 7 == 0,
+        bases=bases,
+        docstring=jsondoc['comment'],
+    )
+
+
+def iter_packages(corpus):
+    # type: (SyntheticCorpus) -> Iterator[Package]
+    """Build the model one package at a time, so a large corpus is never held in memory."""
+    for package_index in range(corpus.package_count):
+        first = package_index * CLASSES_PER_PACKAGE
+        last = min(first + CLASSES_PER_PACKAGE, corpus.size)
+        yield Package(
+            name=corpus.class_name(first).rpartition('.')[0],
+            classes=[make_class(corpus, index) for index in range(first, last)],
+            packages=[],
+        )
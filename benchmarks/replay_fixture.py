@@ -0,0 +1,135 @@
+"""Replay a reflection fixture through the extractor and the formatter, under CPython 3.
+
+Record a fixture inside Ghidra with `GHIDRA_PYI_RECORD_REFLECTION=<path>.jsonl.gz`, then:
+
+    python3 benchmarks/replay_fixture.py <fixture> [--output DIR] [--shard I/N]
+                                         [--profile DIR] [--cprofile FILE]
+
+`--profile` writes the same timing summary and Chrome trace as `GHIDRA_PYI_PROFILE`,
+and `--cprofile` writes `cProfile` stats of the extraction and formatting.
+`--memory` only measures the heap the extracted model keeps,
+with `--compact` as with `GHIDRA_PYI_COMPACT_MODEL`.
+"""
+from __future__ import print_function
+
+import argparse
+import cProfile
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stand_ins  # NOQA: E402
+
+stand_ins.install()
+
+import helper  # NOQA: E402
+import profiler  # NOQA: E402
+import reflection_fixture  # NOQA: E402
+import sharding  # NOQA: E402
+import type_extractor  # NOQA: E402
+import type_formatter  # NOQA: E402
+from type_extractor import ExtractionOptions, Package  # NOQA: E402
+
+
+def get_package_filter(shard):
+    if shard is None:
+        return None
+
+    shard_index, shard_count = sharding.parse_shard(shard)
+    plan = sharding.ShardPlan.from_class_names(helper.get_jsondoc_classes(), shard_count)
+    return plan.get_package_filter(shard_index)
+
+
+def replay(fixture, output, declared_only=False, shard=None, compact=False):
+    extraction = ExtractionOptions(
+        declared_only=declared_only, compact_model=compact,
+        package_filter=get_package_filter(shard),
+    )
+    with profiler.span('Package.from_package'):
+        root = Package.from_package(fixture.root, extraction=extraction)
+    with profiler.span('create_type_hints'):
+        type_formatter.create_type_hints(output, root)
+
+
+def measure_model(fixture, declared_only=False, compact=False):
+    """The bytes allocated by the extraction that the model keeps, without the docs cache."""
+    extraction = ExtractionOptions(declared_only=declared_only, compact_model=compact)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        root = Package.from_package(fixture.root, extraction=extraction)
+        helper.class_doc_cache.clear()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    class_count = sum(len(package.classes) for package in root.iter_packages())
+    return class_count, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('fixture', help='Fixture recorded with GHIDRA_PYI_RECORD_REFLECTION')
+    parser.add_argument('--output',
+                        help='Write the stubs here, instead of to a temporary directory')
+    parser.add_argument('--declared-only', action='store_true',
+                        help='Extract as with GHIDRA_PYI_DECLARED_ONLY')
+    parser.add_argument('--shard',
+                        help='Only replay this <index>/<count> shard, as with GHIDRA_PYI_SHARD')
+    parser.add_argument('--compact', action='store_true',
+                        help='Extract as with GHIDRA_PYI_COMPACT_MODEL')
+    parser.add_argument('--memory', action='store_true',
+                        help='Only measure the heap of the extracted model, '
+                             'instead of replaying the whole run')
+    parser.add_argument('--profile',
+                        help='Write a timing summary and a Chrome trace to this directory')
+    parser.add_argument('--cprofile', help='Write cProfile stats to this file')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fixture = reflection_fixture.load_fixture(args.fixture)
+    print('Loaded {} classes in {} packages in {:.2f}s'.format(
+        fixture.class_count, len(fixture.packages), time.perf_counter() - start,
+    ))
+
+    if args.memory:
+        class_count, size = measure_model(fixture, args.declared_only, args.compact)
+        print('Model of {} classes: {:,} bytes ({} shared overloads)'.format(
+            class_count, size, len(type_extractor.shared_overloads),
+        ))
+        return
+
+    if args.profile:
+        profiler.enable()
+
+    output = args.output or tempfile.mkdtemp(prefix='ghidra-pyi-replay-')
+    try:
+        start = time.perf_counter()
+        if args.cprofile:
+            cProfile.runctx(
+                'replay(fixture, output, args.declared_only, args.shard, args.compact)',
+                globals(), locals(), args.cprofile,
+            )
+        else:
+            replay(fixture, output, args.declared_only, args.shard, args.compact)
+        seconds = time.perf_counter() - start
+    finally:
+        if not args.output:
+            shutil.rmtree(output, ignore_errors=True)
+
+    print('Extracted and formatted {} classes in {:.2f}s ({:.0f} classes/s)'.format(
+        fixture.class_count, seconds, fixture.class_count / seconds,
+    ))
+    if args.profile:
+        profiler.get_profiler().save(args.profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""Micro-benchmarks of the pure-Python hot paths, on synthetic corpora, under CPython 3.
+
+    python3 benchmarks/run_benchmarks.py [--sizes 100,1000,10000,100000] [--depth 8]
+                                         [--json results.json]
+
+Every benchmark runs on every corpus size, and reports its throughput.
+The scaling table divides each throughput by the one of the smallest size,
+so anything that does not stay near 1.0 grows worse than linearly.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stand_ins  # NOQA: E402
+
+stand_ins.install()
+
+import basic_type  # NOQA: E402
+import helper  # NOQA: E402
+import type_formatter  # NOQA: E402
+from basic_type import BasicType  # NOQA: E402
+from corpus import SyntheticCorpus, SyntheticJsonDocSource, iter_packages  # NOQA: E402
+
+
+def clear_caches():
+    basic_type._interned_types.clear()
+    basic_type._types_by_class.clear()
+    basic_type._types_by_definition.clear()
+    helper.class_doc_cache.clear()
+
+
+class Timer(object):
+    """Accumulates the time spent in `with` blocks, so setup work can be left out."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds += time.perf_counter() - self._start
+
+
+def bench_build_jsondoc_index(corpus, timer):
+    with timer:
+        helper.JsonDocIndex.build(SyntheticJsonDocSource(corpus), helper.get_jsondoc_index_path())
+    helper.reset_jsondoc_source()
+    return corpus.size
+
+
+def bench_from_java_cold(corpus, timer):
+    definitions = list(corpus.iter_type_definitions())
+    clear_caches()
+    with timer:
+        for definition in definitions:
+            BasicType.from_java(definition)
+    return len(definitions)
+
+
+def bench_from_java_warm(corpus, timer):
+    definitions = list(corpus.iter_type_definitions())
+    for definition in definitions:
+        BasicType.from_java(definition)
+    with timer:
+        for definition in definitions:
+            BasicType.from_java(definition)
+    return len(definitions)
+
+
+def bench_class_doc_resolution(corpus, timer):
+    """Load the docs of every class, and resolve the overload set of each of its methods."""
+    clear_caches()
+    with timer:
+        for class_name in corpus.class_names:
+            docs = helper.get_class_doc(class_name)
+            for name in docs.methods:
+                docs.get_overload_set(name)
+    return corpus.size
+
+
+def _iter_overload_lookups(corpus):
+    """The overload lookups of every class, one class at a time."""
+    for class_name in corpus.class_names:
+        docs = helper.get_class_doc(class_name)
+        lookups = []
+        for name in docs.methods:
+            overload_set = docs.get_overload_set(name)
+            for overload in overload_set.overloads:
+                param_types = [
+                    BasicType.from_java(param['type_long']) for param in overload.jsondoc['params']
+                ]
+                lookups.append((overload_set, param_types))
+        yield lookups
+
+
+def bench_get_overload_cold(corpus, timer):
+    """A first pass over the overload sets of each class, which indexes them."""
+    clear_caches()
+    count = 0
+    for lookups in _iter_overload_lookups(corpus):
+        for overload_set, _param_types in lookups:
+            overload_set._index = None
+        with timer:
+            for overload_set, param_types in lookups:
+                overload_set.get_overload(param_types)
+        count += len(lookups)
+    return count
+
+
+def bench_get_overload_warm(corpus, timer):
+    clear_caches()
+    count = 0
+    for lookups in _iter_overload_lookups(corpus):
+        for overload_set, param_types in lookups:
+            overload_set.get_overload(param_types)
+        with timer:
+            for overload_set, param_types in lookups:
+                overload_set.get_overload(param_types)
+        count += len(lookups)
+    return count
+
+
+def bench_format_pyi_class(corpus, timer):
+    clear_caches()
+    classes = 0
+    for package in iter_packages(corpus):
+        with timer:
+            for cls in package.classes:
+                type_formatter.format_pyi_class(cls)
+        classes += len(package.classes)
+    return classes
+
+
+def bench_class_fingerprint(corpus, timer):
+    clear_caches()
+    classes = 0
+    for package in iter_packages(corpus):
+        with timer:
+            for cls in package.classes:
+                cls.fingerprint
+        classes += len(package.classes)
+    return classes
+
+
+BENCHMARKS = OrderedDict([
+    ('build_jsondoc_index', (bench_build_jsondoc_index, 'classes')),
+    ('BasicType.from_java (cold)', (bench_from_java_cold, 'types')),
+    ('BasicType.from_java (warm)', (bench_from_java_warm, 'types')),
+    ('ClassDoc overload resolution', (bench_class_doc_resolution, 'classes')),
+    ('OverloadSetDoc.get_overload (cold)', (bench_get_overload_cold, 'lookups')),
+    ('OverloadSetDoc.get_overload (warm)', (bench_get_overload_warm, 'lookups')),
+    ('format_pyi_class', (bench_format_pyi_class, 'classes')),
+    ('Class.fingerprint', (bench_class_fingerprint, 'classes')),
+])
+
+
+def run(sizes, depth, methods, repeat, selected):
+    results = []
+    for size in sizes:
+        corpus = SyntheticCorpus(size, depth=depth, methods=methods)
+
+        # Every corpus gets its own index, next to the ones of other sizes.
+        stand_ins.Application.version = 'benchmark-{}-{}-{}'.format(size, depth, methods)
+        helper.reset_jsondoc_source()
+        clear_caches()
+
+        for name, (benchmark, unit) in BENCHMARKS.items():
+            if name != 'build_jsondoc_index' and selected and not any(s in name for s in selected):
+                continue
+
+            best = None
+            for _ in range(repeat):
+                timer = Timer()
+                count = benchmark(corpus, timer)
+                if best is None or timer.seconds < best:
+                    best = timer.seconds
+
+            result = OrderedDict([
+                ('benchmark', name), ('size', size), ('count', count), ('unit', unit),
+                ('seconds', best), ('throughput', count / best if best else float('inf')),
+            ])
+            results.append(result)
+            print((
+                '{size:>8} {benchmark:<36} {count:>10} {unit:<8} '
+                '{seconds:>9.3f}s {throughput:>14,.0f}/s'
+            ).format(**result))
+            sys.stdout.flush()
+
+    return results
+
+
+def print_scaling(results):
+    baselines = {}
+    print()
+    print('Throughput relative to the smallest corpus:')
+    for result in results:
+        baseline = baselines.setdefault(result['benchmark'], result['throughput'])
+        print('{size:>8} {benchmark:<36} {relative:>6.2f}'.format(
+            relative=result['throughput'] / baseline, **result
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='Comma-separated corpus sizes, in classes (default: %(default)s)')
+    parser.add_argument('--depth', type=int, default=8,
+                        help='Length of inheritance chains (default: %(default)s)')
+    parser.add_argument('--methods', type=int, default=12,
+                        help='Method names per class (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per benchmark, the best one is kept')
+    parser.add_argument('--only', action='append', default=[],
+                        help='Only run benchmarks whose name contains this. Can be repeated.')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated jsondoc indices')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    try:
+        results = run(sizes, args.depth, args.methods, args.repeat, args.only)
+        print_scaling(results)
+    finally:
+        helper.reset_jsondoc_source()
+        if args.keep:
+            print('Indices kept in {}'.format(stand_ins.Application.root))
+        else:
+            shutil.rmtree(stand_ins.Application.root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(
+                {'depth': args.depth, 'methods': args.methods, 'results': results}, f, indent=2,
+            )
+
+
+if __name__ == '__main__':
+    main()
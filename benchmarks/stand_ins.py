@@ -0,0 +1,118 @@
+"""Stand-ins for the `java.*` and `ghidra.*` modules, so the generator modules import under CPython.
+
+Only what those modules touch outside of live reflection is provided.
+"""
+import os
+import sys
+import tempfile
+import time
+import types
+
+
+class _JavaException(Exception):
+    pass
+
+
+class IllegalArgumentException(_JavaException):
+    pass
+
+
+class NoClassDefFoundError(_JavaException):
+    pass
+
+
+class Callable(object):
+    pass
+
+
+class _Runtime(object):
+    def availableProcessors(self):
+        return os.cpu_count() or 1
+
+
+class Runtime(object):
+    @staticmethod
+    def getRuntime():
+        return _Runtime()
+
+
+class System(object):
+    @staticmethod
+    def nanoTime():
+        return time.perf_counter_ns()
+
+
+# java.lang.reflect.Modifier constants
+PUBLIC = 0x1
+STATIC = 0x8
+FINAL = 0x10
+
+
+class _File(object):
+    def __init__(self, path):
+        self.path = path
+
+    def getAbsolutePath(self):
+        return self.path
+
+
+class Application(object):
+    """Points the user cache and the installation at a temporary directory."""
+    root = None
+    version = 'benchmark'
+
+    @classmethod
+    def getUserCacheDirectory(cls):
+        return _File(os.path.join(cls.root, 'cache'))
+
+    @classmethod
+    def getInstallationDirectory(cls):
+        return _File(os.path.join(cls.root, 'install'))
+
+    @classmethod
+    def getApplicationVersion(cls):
+        return cls.version
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+
+    parent_name, _sep, child_name = name.rpartition('.')
+    if parent_name:
+        setattr(sys.modules[parent_name], child_name, module)
+    return module
+
+
+def install(root=None):
+    """Install the stand-ins, with a cache under `root` (a new temporary directory by default)."""
+    Application.root = root or tempfile.mkdtemp(prefix='ghidra-pyi-benchmark-')
+
+    _module('java')
+    _module(
+        'java.lang',
+        Exception=_JavaException,
+        IllegalArgumentException=IllegalArgumentException,
+        NoClassDefFoundError=NoClassDefFoundError,
+        Runtime=Runtime,
+        System=System,
+        Throwable=_JavaException,
+    )
+    _module('java.lang.reflect')
+    _module(
+        'java.lang.reflect.Modifier',
+        PUBLIC=PUBLIC,
+        STATIC=STATIC,
+        FINAL=FINAL,
+        isPublic=lambda modifiers: bool(modifiers & PUBLIC),
+        isStatic=lambda modifiers: bool(modifiers & STATIC),
+        isFinal=lambda modifiers: bool(modifiers & FINAL),
+    )
+    _module('java.util')
+    _module('java.util.concurrent', Callable=Callable)
+
+    _module('ghidra')
+    _module('ghidra.framework', Application=Application)
+
+    return Application.root
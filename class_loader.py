@@ -5,11 +5,15 @@ open `api/overview-tree.html` from the Ghidra docs in a web-browser
 and copy it's contents to a text file.
 """
 
+from __future__ import print_function
+
 import helper
 import importlib
 import re
 import os
 import java.lang
+import java.util.concurrent
+from typing import Iterable, List, Set
 
 
 def get_class_name(line):
@@ -35,14 +39,92 @@ def parse_class_list(list_path=None):
         yield get_class_name(class_entry)
 
 
-def load_all_classes(prefix='ghidra', list_path=None):
+def get_failed_classes_path():
+    return os.path.join(helper.get_generator_cache_dir(), 'failed_classes.list')
+
+
+def read_failed_classes():
+    # type: () -> Set[str]
+    """Read the classes that failed loading in previous runs of this Ghidra version."""
+    try:
+        with open(get_failed_classes_path()) as f:
+            return set(line.strip() for line in f if line.strip())
+    except IOError:
+        return set()
+
+
+def write_failed_classes(class_names):
+    # type: (Iterable[str]) -> None
+    path = get_failed_classes_path()
+    helper.ensure_directory(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(''.join('{}\n'.format(class_name) for class_name in sorted(class_names)))
+
+
+def try_load_class(name):
+    # type: (str) -> bool
+    try:
+        load_class(name)
+        return True
+    except (java.lang.Throwable, Exception):
+        return False
+
+
+class ClassLoadingTask(java.util.concurrent.Callable):
+    def __init__(self, name):
+        # type: (str) -> None
+        self.name = name
+
+    def call(self):
+        return try_load_class(self.name)
+
+
+def load_classes(class_names, workers=1):
+    # type: (List[str], int) -> Set[str]
+    """Load classes, on a thread pool if there is more than one worker.
+
+    Returns the names of the classes that failed loading.
+    """
+    if workers <= 1:
+        return set(name for name in class_names if not try_load_class(name))
+
+    executor = java.util.concurrent.Executors.newFixedThreadPool(workers)
+    try:
+        futures = [(name, executor.submit(ClassLoadingTask(name))) for name in class_names]
+        return set(name for name, future in futures if not future.get())
+    finally:
+        executor.shutdownNow()
+
+
+def get_known_classes(list_path=None):
+    # type: (str) -> Set[str]
+    """The classes of `classes.list` and of the API docs."""
     parsed_classes = set(parse_class_list(list_path=list_path))
     jsondoc_classes = set(helper.get_jsondoc_classes())
-    class_names = parsed_classes | jsondoc_classes
-
-    for class_name in class_names:
-        if class_name.startswith(prefix):
-            try:
-                load_class(class_name)
-            except (java.lang.Throwable, Exception):
-                print('Failed loading {}'.format(class_name))
+    return set(class_name for class_name in parsed_classes | jsondoc_classes if class_name)
+
+
+def load_all_classes(prefix='ghidra', list_path=None, workers=1, recheck=False, class_filter=None):
+    """Load all known classes under `prefix`, and accepted by `class_filter` if set.
+
+    Classes that failed loading in a previous run of the same Ghidra version are skipped,
+    unless `recheck` is set.
+    """
+    class_names = get_known_classes(list_path=list_path)
+
+    known_failures = set() if recheck else read_failed_classes()
+    if known_failures:
+        print('Skipping {} classes that failed loading before'.format(len(known_failures)))
+
+    failures = load_classes(
+        sorted(
+            class_name for class_name in class_names
+            if class_name.startswith(prefix) and class_name not in known_failures
+            and (class_filter is None or class_filter(class_name))
+        ),
+        workers=workers,
+    )
+    for class_name in sorted(failures):
+        print('Failed loading {}'.format(class_name))
+
+    write_failed_classes(known_failures | failures)
@@ -0,0 +1,424 @@
+"""A persistent cache of extracted class models, by the contents of the jars they come from.
+
+Between builds of Ghidra most jars do not change, so the classes of unchanged jars
+are taken from the cache instead of being loaded and reflected again.
+The models of each jar are stored in the format of `model_dump`,
+in a file named by the jar's content hash.
+They are only used while the jar, and every jar their supertypes come from, are unchanged,
+and with the same generator and extraction options.
+Each class is only used while the docs of the class and of all its supertypes are unchanged.
+"""
+from __future__ import print_function
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import defaultdict
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    import java.io
+    import java.lang
+except ImportError:
+    java = None
+
+import basic_type
+import helper
+import model_dump
+import type_extractor
+from manifest import get_fingerprint, get_module_fingerprint
+from type_extractor import Class, ExtractionOptions, Package
+from version import PYI_VERSION
+
+CACHE_FORMAT = 'ghidra-pyi-extraction-cache'
+CACHE_VERSION = 3
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_cache_dir():
+    # type: () -> str
+    return os.path.join(helper.get_generator_cache_dir(), 'extraction-cache')
+
+
+def hash_file(path):
+    # type: (str) -> str
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_class_location(java_class):
+    # type: (Any) -> Optional[str]
+    """The path of the jar or directory a class was loaded from, or `None` for JDK classes."""
+    code_source = java.lang.Class.getProtectionDomain(java_class).getCodeSource()
+    if code_source is None or code_source.getLocation() is None:
+        return None
+    return java.io.File(code_source.getLocation().toURI()).getPath()
+
+
+def get_hierarchy_locations(cls):
+    # type: (type) -> Optional[Set[str]]
+    """The jars of a class, of its nested classes and of all of their supertypes.
+
+    Returns `None` if any of them does not come from a jar, or cannot be loaded.
+    """
+    locations = set()
+    seen = set()
+    stack = [cls]
+    try:
+        while stack:
+            current = stack.pop()
+            if current is None or current in seen:
+                continue
+            seen.add(current)
+
+            location = get_class_location(current)
+            if location is not None:
+                if not location.endswith('.jar'):
+                    return None
+                locations.add(location)
+
+            stack.append(java.lang.Class.getSuperclass(current))
+            stack.extend(java.lang.Class.getInterfaces(current))
+            stack.extend(java.lang.Class.getDeclaredClasses(current))
+    except (java.lang.Throwable, Exception):
+        return None
+
+    return locations
+
+
+class ExtractionCache(object):
+    """Cached class models, for a single run with the given cache `key`.
+
+    `load` reads the models of all unchanged jars,
+    and keeps them compressed until their package is first needed.
+    During the extraction, `get` hands them out instead of extracting classes again,
+    and `record` collects newly extracted ones.
+    `pop_classes` and `get_subpackage_names` hand out the cached classes
+    that were not loaded this run, one package at a time.
+    `save` stores the models of the jars that were extracted this run.
+    The cache is thread-safe.
+    """
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, directory, key):
+        # type: (str, str) -> None
+        self.directory = directory
+        self.key = key
+        self._lock = threading.Lock()
+        # File hashes by path, with the size and mtime they were computed for.
+        self._file_hashes = {}  # type: Dict[str, Dict[str, Any]]
+        # The names of the valid cached classes, and of those not handed out yet by package.
+        self.class_names = set()  # type: Set[str]
+        self._remaining = defaultdict(set)  # type: Dict[str, Set[str]]
+        # The compressed dumps of the packages whose models were not needed yet,
+        # and the models of those that were.
+        self._dumps = defaultdict(list)  # type: Dict[str, List[bytes]]
+        self._models = {}  # type: Dict[str, Dict[str, Class]]
+        # The dependencies of the jars whose models were loaded.
+        self._loaded_dependencies = {}  # type: Dict[str, Set[str]]
+        self._records = defaultdict(dict)  # type: Dict[str, Dict[str, Class]]
+        self._dependencies = defaultdict(set)  # type: Dict[str, Set[str]]
+        # The docs each cached class was extracted from, and their fingerprints.
+        self._class_docs = {}  # type: Dict[str, List[str]]
+        self._docs_fingerprints = {}  # type: Dict[str, str]
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            return
+
+        if index.get('version') == CACHE_VERSION:
+            self._file_hashes = index['files']
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, self.INDEX_FILENAME)
+
+    def get_file_hash(self, path):
+        # type: (str) -> Optional[str]
+        """The content hash of a file, only computed again if its size or mtime changed."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._file_hashes.get(path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['sha256']
+
+        sha256 = hash_file(path)
+        with self._lock:
+            self._file_hashes[path] = {
+                'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha256,
+            }
+        return sha256
+
+    def _get_models_path(self, jar_hash):
+        # type: (str) -> str
+        return os.path.join(self.directory, '{}-{}.jsonl.gz'.format(jar_hash, self.key))
+
+    def _get_docs_fingerprint(self, class_name):
+        # type: (str) -> str
+        with self._lock:
+            fingerprint = self._docs_fingerprints.get(class_name)
+        if fingerprint is None:
+            fingerprint = helper.get_jsondoc_fingerprint(class_name)
+            with self._lock:
+                self._docs_fingerprints[class_name] = fingerprint
+        return fingerprint
+
+    def _read_models_file(self, jar_path):
+        # type: (str) -> Optional[Tuple[Dict[str, Any], List[Tuple[str, bytes]]]]
+        """The header of the models file of a jar, and the dump of each of its packages.
+
+        Returns `None` if there is no such file, or if it is outdated.
+        """
+        jar_hash = self.get_file_hash(jar_path)
+        if jar_hash is None:
+            return None
+
+        try:
+            f = gzip.open(self._get_models_path(jar_hash), 'rb')
+        except IOError:
+            return None
+
+        with f:
+            header = json.loads(f.readline().decode('ascii'))
+            if header.get('format') != CACHE_FORMAT or header.get('version') != CACHE_VERSION:
+                return None
+            for path, dependency_hash in header['dependencies'].items():
+                if self.get_file_hash(path) != dependency_hash:
+                    return None
+            dumps = list(zip(header['packages'], f))
+
+        if len(dumps) != len(header['packages']):
+            raise ValueError('Truncated models file for {}'.format(jar_path))
+        return header, dumps
+
+    def load(self):
+        # type: () -> int
+        """Load the models of all unchanged jars, and return the number of classes.
+
+        Only the dumps of the models are kept, compressed,
+        and the models of each package are loaded when they are first needed.
+        Classes whose docs changed are left out.
+        """
+        for jar_path in sorted(self._file_hashes):
+            if not jar_path.endswith('.jar'):
+                continue
+
+            try:
+                models_file = self._read_models_file(jar_path)
+            except (IOError, EOFError, ValueError, KeyError):
+                # A damaged file is extracted again, and replaced.
+                continue
+            if models_file is None:
+                continue
+
+            header, dumps = models_file
+            changed_docs = set(
+                name for name, fingerprint in header['docs'].items()
+                if self._get_docs_fingerprint(name) != fingerprint
+            )
+            for class_name, class_docs in header['classes'].items():
+                if changed_docs.isdisjoint(class_docs):
+                    self.class_names.add(class_name)
+                    self._class_docs[class_name] = class_docs
+            self._loaded_dependencies[jar_path] = set(header['dependencies'])
+            for package_name, line in dumps:
+                self._dumps[package_name].append(zlib.compress(line, 1))
+
+        for class_name in self.class_names:
+            package_name, _sep, name = class_name.rpartition('.')
+            self._remaining[package_name].add(name)
+        return len(self.class_names)
+
+    def _iter_valid_models(self, dumps):
+        # type: (Iterable[bytes]) -> Iterator[Tuple[str, Class]]
+        """The valid models in package dumps, by class name."""
+        for line in dumps:
+            package = model_dump.load_package(json.loads(line.decode('ascii')))
+            for cls in package.classes:
+                class_name = '{}.{}'.format(package.name, cls.name)
+                if class_name in self.class_names:
+                    yield class_name, cls
+
+    def _get_models(self, package_name):
+        # type: (str) -> Dict[str, Class]
+        """The valid cached models of a package, loaded from their dumps on first use."""
+        models = self._models.get(package_name)
+        if models is None:
+            dumps = (zlib.decompress(dump) for dump in self._dumps.pop(package_name, ()))
+            models = self._models[package_name] = dict(
+                (class_name.rpartition('.')[-1], cls)
+                for class_name, cls in self._iter_valid_models(dumps)
+            )
+        return models
+
+    def get(self, class_name):
+        # type: (str) -> Optional[Class]
+        package_name, _sep, name = class_name.rpartition('.')
+        with self._lock:
+            model = None
+            if class_name in self.class_names:
+                model = self._get_models(package_name).get(name)
+            if model is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._remaining[package_name].discard(name)
+            return model
+
+    def record(self, class_name, cls, model):
+        # type: (str, type, Class) -> None
+        locations = get_hierarchy_locations(cls)
+        if not locations:
+            return
+
+        jar_path = get_class_location(cls)
+        if jar_path is None:
+            return
+
+        for location in locations:
+            self.get_file_hash(location)
+        docs_fingerprints = helper.get_hierarchy_docs_fingerprints(class_name)
+
+        with self._lock:
+            self._records[jar_path][class_name] = model
+            self._dependencies[jar_path].update(locations)
+            self._class_docs[class_name] = sorted(docs_fingerprints)
+            self._docs_fingerprints.update(docs_fingerprints)
+
+    def pop_classes(self, package_name):
+        # type: (str) -> List[Class]
+        """Hand out the cached classes of a package that were not extracted, once."""
+        with self._lock:
+            names = self._remaining.pop(package_name, set())
+            models = self._get_models(package_name) if names else {}
+            # The models are only held until they are handed out.
+            self._models.pop(package_name, None)
+        return [models[name] for name in sorted(names) if name in models]
+
+    def get_subpackage_names(self, package_name):
+        # type: (str) -> List[str]
+        """The direct sub-packages of a package that still have cached classes to hand out."""
+        prefix = package_name + '.'
+        with self._lock:
+            names = set(
+                prefix + name[len(prefix):].partition('.')[0]
+                for name, remaining in self._remaining.items()
+                if remaining and name.startswith(prefix)
+            )
+        return sorted(names)
+
+    def iter_and_save(self, packages):
+        # type: (Iterable[Package]) -> Iterator[Package]
+        """Pass the packages through, and save the cache once all were consumed."""
+        for package in packages:
+            yield package
+        self.save()
+
+    def _write_models(self, jar_path, records):
+        # type: (str, Dict[str, Class]) -> None
+        """Write the models recorded for a jar, with the valid ones of its current file."""
+        models = {}  # type: Dict[str, Class]
+        if jar_path in self._loaded_dependencies:
+            models_file = self._read_models_file(jar_path)
+            if models_file is not None:
+                models.update(self._iter_valid_models(line for _name, line in models_file[1]))
+        models.update(records)
+        dependencies = self._dependencies[jar_path] | self._loaded_dependencies.get(jar_path, set())
+        path = self._get_models_path(self._file_hashes[jar_path]['sha256'])
+
+        packages = defaultdict(list)  # type: Dict[str, List[Class]]
+        for class_name, model in models.items():
+            packages[class_name.rpartition('.')[0]].append(model)
+
+        header = {
+            'format': CACHE_FORMAT,
+            'version': CACHE_VERSION,
+            'jar': jar_path,
+            'dependencies': dict(
+                (location, self._file_hashes[location]['sha256'])
+                for location in dependencies
+            ),
+            'classes': dict(
+                (class_name, self._class_docs[class_name]) for class_name in models
+            ),
+            'docs': dict(
+                (name, self._docs_fingerprints[name])
+                for class_name in models
+                for name in self._class_docs[class_name]
+            ),
+            'packages': sorted(packages),
+        }
+        temporary_path = path + '.tmp'
+        with gzip.open(temporary_path, 'wb') as f:
+            f.write(json.dumps(header, sort_keys=True).encode('ascii') + b'\n')
+            for package_name in sorted(packages):
+                package = Package(name=package_name, classes=packages[package_name], packages=[])
+                line = json.dumps(model_dump.dump_package(package, keep_refs=True), sort_keys=True)
+                f.write(line.encode('ascii') + b'\n')
+        os.rename(temporary_path, path)
+
+    def _remove_stale(self):
+        """Remove the models of jars that no longer exist, and those of other cache keys."""
+        current_hashes = set(entry['sha256'] for entry in self._file_hashes.values())
+        suffix = '.jsonl.gz'
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(suffix):
+                continue
+
+            jar_hash, _sep, key = filename[:-len(suffix)].partition('-')
+            if jar_hash not in current_hashes or key != self.key:
+                os.remove(os.path.join(self.directory, filename))
+
+    def save(self):
+        helper.ensure_directory(self.directory)
+        for jar_path, models in sorted(self._records.items()):
+            self._write_models(jar_path, models)
+
+        # Forget the files that no longer exist, so their models are removed.
+        self._file_hashes = dict(
+            (path, entry) for path, entry in self._file_hashes.items() if os.path.exists(path)
+        )
+        with open(self.index_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'files': self._file_hashes}, f, sort_keys=True)
+        self._remove_stale()
+
+        print('Extraction cache: {} classes reused, {} extracted'.format(self.hits, self.misses))
+
+
+def get_cache_key(extraction):
+    # type: (ExtractionOptions) -> str
+    """Fingerprint everything but the jars and the docs that affects the extracted models."""
+    return get_fingerprint(''.join([
+        PYI_VERSION,
+        get_module_fingerprint(type_extractor),
+        get_module_fingerprint(basic_type),
+        get_module_fingerprint(helper),
+        get_module_fingerprint(model_dump),
+        repr((extraction.declared_only, extraction.java_reflection, extraction.compact_model)),
+        java.lang.System.getProperty('java.version'),
+    ]))
+
+
+def open_cache(extraction, directory=None):
+    # type: (ExtractionOptions, Optional[str]) -> ExtractionCache
+    """Open the cache for a run with `extraction`, and load the models of all unchanged jars."""
+    cache = ExtractionCache(directory or get_cache_dir(), get_cache_key(extraction)[:16])
+    class_count = cache.load()
+    print('Extraction cache: {} classes of unchanged jars'.format(class_count))
+    return cache
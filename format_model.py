@@ -0,0 +1,221 @@
+"""Format a model dump into `.pyi` stubs under CPython 3, on a pool of processes.
+
+The dump is written by `generate_ghidra_pyi.py` when `GHIDRA_PYI_DUMP_MODEL` is set:
+
+    python3 format_model.py model.jsonl.gz <pyi root> [--processes N]
+
+With `--ghidra-version`, the stub package is generated as well,
+and with `--wheel` as well, the stubs are written straight into a wheel of the package instead.
+`--stub-profile` selects how much of the docs goes into the stubs,
+and `--profile-sizes` only reports the size of the stubs with every profile.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import type_formatter
+from generate_stub_package import generate_package, restore_package_folder
+from manifest import Manifest
+from model_dump import iter_model_dump_lines, load_package
+from stub_writer import ImportIndex, StubWriter
+from wheel_writer import WheelWriter
+
+# Set in each worker process by `init_worker`.
+_root = None  # type: Optional[str]
+_previous_files = {}  # type: Dict[str, Dict[str, str]]
+_stub_profile = type_formatter.FULL
+
+# The path and imports of a package, and the path, model fingerprint and text of its classes.
+FormattedPackage = Tuple[str, List[str], List[Tuple[str, str, Optional[str]]]]
+
+
+def init_worker(root, previous_files, stub_profile=type_formatter.FULL):
+    # type: (str, Dict[str, Dict[str, str]], str) -> None
+    global _root, _previous_files, _stub_profile
+    _root = root
+    _previous_files = previous_files
+    _stub_profile = stub_profile
+
+
+def format_package_line(line):
+    # type: (bytes) -> FormattedPackage
+    """Format the classes of a single dumped package.
+
+    Classes whose model did not change since the previous run are not formatted,
+    and are returned without text.
+    """
+    package = load_package(json.loads(line.decode('ascii')))
+    package_path = type_formatter.get_package_path(package)
+
+    formatted = []
+    for cls in package.classes:
+        relative_path = type_formatter.get_class_path(package_path, cls)
+        model_fingerprint = cls.fingerprint
+
+        entry = _previous_files.get(relative_path)
+        if (
+            entry is not None
+            and entry['model'] == model_fingerprint
+            and os.path.exists(os.path.join(_root, relative_path))
+        ):
+            formatted.append((relative_path, model_fingerprint, None))
+        else:
+            pyi_content = type_formatter.format_pyi_class(cls, stub_profile=_stub_profile)
+            formatted.append((relative_path, model_fingerprint, pyi_content))
+
+    return package_path, sorted(type_formatter.get_package_imports(package)), formatted
+
+
+def measure_package_line(line):
+    # type: (bytes) -> Dict[str, Tuple[int, int]]
+    """Count the files and bytes of a single dumped package, with every stub profile."""
+    package = load_package(json.loads(line.decode('ascii')))
+    init_size = len(ImportIndex.format(type_formatter.get_package_imports(package)).encode('utf8'))
+
+    sizes = {}
+    for stub_profile in type_formatter.STUB_PROFILES:
+        byte_count = init_size + sum(
+            len(type_formatter.format_pyi_class(cls, stub_profile=stub_profile).encode('utf8'))
+            for cls in package.classes
+        )
+        sizes[stub_profile] = (len(package.classes) + 1, byte_count)
+    return sizes
+
+
+def report_profile_sizes(dump_path, processes=None):
+    # type: (str, Optional[int]) -> None
+    totals = dict((stub_profile, [0, 0]) for stub_profile in type_formatter.STUB_PROFILES)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for sizes in pool.imap(measure_package_line, iter_model_dump_lines(dump_path), chunksize=4):
+            for stub_profile, (file_count, byte_count) in sizes.items():
+                totals[stub_profile][0] += file_count
+                totals[stub_profile][1] += byte_count
+    finally:
+        pool.close()
+        pool.join()
+
+    print('{:<12}{:>10}{:>16}'.format('Profile', 'Files', 'Bytes'))
+    for stub_profile in type_formatter.STUB_PROFILES:
+        file_count, byte_count = totals[stub_profile]
+        print('{:<12}{:>10,}{:>16,}'.format(stub_profile, file_count, byte_count))
+
+
+def write_formatted_packages(writer, results, manifest=None):
+    # type: (Any, Iterable[FormattedPackage], Optional[Manifest]) -> None
+    import_index = ImportIndex()
+    for package_path, imports, formatted in results:
+        import_index.add(package_path, imports)
+
+        for relative_path, model_fingerprint, pyi_content in formatted:
+            if pyi_content is None:
+                manifest.is_unchanged(relative_path, model_fingerprint)
+                continue
+
+            if manifest is None or manifest.record(relative_path, model_fingerprint, pyi_content):
+                writer.write(relative_path, pyi_content)
+
+    type_formatter.write_imports(writer, import_index, manifest)
+
+
+def format_model(
+    dump_path, root, processes=None, wheel_writer=None, stub_profile=type_formatter.FULL,
+):
+    # type: (str, str, Optional[int], Optional[WheelWriter], str) -> None
+    """Format a model dump under `root`, or into `wheel_writer` if set."""
+    manifest = None
+    previous_files = {}  # type: Dict[str, Dict[str, str]]
+    if wheel_writer is None:
+        manifest = Manifest(root, type_formatter.get_format_key(stub_profile))
+        previous_files = manifest.previous
+
+    pool = multiprocessing.Pool(
+        processes, initializer=init_worker, initargs=(root, previous_files, stub_profile),
+    )
+    try:
+        results = pool.imap(format_package_line, iter_model_dump_lines(dump_path), chunksize=4)
+        if wheel_writer is not None:
+            write_formatted_packages(wheel_writer, results)
+        else:
+            with StubWriter(root) as writer:
+                write_formatted_packages(writer, results, manifest)
+    finally:
+        pool.close()
+        pool.join()
+
+    if manifest is not None:
+        manifest.save()
+
+
+def write_wheel(
+    dump_path, root, ghidra_version, package_version, processes=None,
+    stub_profile=type_formatter.FULL,
+):
+    # type: (str, str, str, str, Optional[int], str) -> None
+    with WheelWriter(root, ghidra_version, package_version) as writer:
+        format_model(
+            dump_path, root, processes=processes, wheel_writer=writer, stub_profile=stub_profile,
+        )
+
+        builtins_path = os.path.join(root, 'ghidra_builtins.pyi')
+        if os.path.exists(builtins_path):
+            writer.write_file('ghidra/ghidra_builtins.pyi', builtins_path)
+
+    print('Wrote {} ({} stubs, {} files, {} bytes)'.format(
+        writer.path, stub_profile, writer.file_count, writer.byte_count,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dump_path', help='Model dump written by generate_ghidra_pyi.py')
+    parser.add_argument('pyi_root', help='.pyi root directory')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of formatting processes. Defaults to the number of CPUs.')
+    parser.add_argument('--ghidra-version',
+                        help='Generate the stub package for this Ghidra version')
+    parser.add_argument('--package-version', default='DEV', help='Version of the stub package')
+    parser.add_argument('--wheel', action='store_true',
+                        help='Write the stubs straight into a wheel of the stub package. '
+                             'Requires --ghidra-version.')
+    parser.add_argument('--stub-profile', choices=type_formatter.STUB_PROFILES,
+                        default=type_formatter.FULL,
+                        help='Keep all docs, only their first sentences, or no docs at all')
+    parser.add_argument('--profile-sizes', action='store_true',
+                        help='Only report the number of files and bytes of the stubs '
+                             'with every stub profile')
+    args = parser.parse_args()
+
+    if args.profile_sizes:
+        report_profile_sizes(args.dump_path, processes=args.processes)
+        return
+
+    if args.wheel:
+        if not args.ghidra_version:
+            parser.error('--wheel requires --ghidra-version')
+        write_wheel(
+            args.dump_path, args.pyi_root, args.ghidra_version, args.package_version,
+            processes=args.processes, stub_profile=args.stub_profile,
+        )
+        return
+
+    restore_package_folder(args.pyi_root)
+    format_model(
+        args.dump_path, args.pyi_root, processes=args.processes, stub_profile=args.stub_profile,
+    )
+
+    if args.ghidra_version:
+        generate_package(
+            args.pyi_root, args.ghidra_version,
+            stub_version=args.package_version, stub_profile=args.stub_profile,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
 # Generate .pyi's for Ghidra.
 # @category: IDE Helpers
 from __future__ import print_function
+import os
+
+import attr
+from typing import Iterable, Iterator
+
 import type_formatter
 
 import ghidra
@@ -11,20 +16,44 @@ except:
     pass
 from __main__ import askDirectory, askYesNo, getGhidraVersion
 
-from generate_stub_package import generate_package
+from generate_stub_package import generate_package, restore_package_folder
 
 import class_loader
+import extraction_cache
 import type_extractor
 import pythonscript_handler
 import helper
+import model_dump
+import profiler
+import reflection_fixture
+import sharding
+from options import Options
+from wheel_writer import WheelWriter
 
 my_globals = globals().copy()
 
 
 def main():
     # type: () -> None
-    if not helper.are_docs_available():
-        helper.extract_jsondoc()
+    options = Options.from_environment()
+    if options.profile:
+        profiler.enable()
+
+    try:
+        generate(options)
+    finally:
+        if options.profile:
+            profiler.get_profiler().save(options.profile)
+
+
+def generate(options):
+    # type: (Options) -> None
+    if options.extract_docs and not helper.are_docs_available():
+        with profiler.span('extract_jsondoc'):
+            helper.extract_jsondoc(json_only=True)
+    if not helper.is_jsondoc_index_available():
+        with profiler.span('build_jsondoc_index'):
+            helper.build_jsondoc_index()
     try:
         pyi_root = askDirectory('.pyi root directory', 'Select').getPath()
         print(pyi_root)
@@ -33,13 +62,112 @@ def main():
         print('Generation canceled: No output directory selected.')
         return
 
-    class_loader.load_all_classes(prefix='ghidra.')
+    workers = options.workers or type_extractor.get_default_worker_count()
+    extraction = type_extractor.ExtractionOptions(
+        declared_only=options.declared_only, java_reflection=options.java_reflection,
+        compact_model=options.compact_model,
+    )
+    class_filter = package_filter = cache = None
+    if options.shard:
+        shard_index, shard_count = options.shard
+        plan = sharding.ShardPlan.from_class_names(
+            (name for name in class_loader.get_known_classes() if name.startswith('ghidra.')),
+            shard_count,
+        )
+        class_filter = plan.get_class_filter(shard_index)
+        package_filter = plan.get_package_filter(shard_index)
+        print('Generating shard {} of {} ({} packages)'.format(
+            shard_index, shard_count, len(plan.get_packages(shard_index)),
+        ))
+        extraction = attr.evolve(extraction, package_filter=package_filter)
+
+    elif options.extraction_cache and not options.record_reflection:
+        # Shards and recordings need all of their classes loaded, so they do not use the cache.
+        with profiler.span('open_extraction_cache'):
+            cache = extraction_cache.open_cache(extraction)
+        cached_class_names = cache.class_names
+
+        def class_filter(class_name):
+            return class_name not in cached_class_names
+
+    with profiler.span('load_all_classes'):
+        class_loader.load_all_classes(
+            prefix='ghidra.', workers=workers, recheck=options.recheck_classes,
+            class_filter=class_filter,
+        )
+
+    with profiler.span('create_mock'):
+        pythonscript_handler.create_mock(pyi_root, my_globals, extraction)
+
+    if options.record_reflection:
+        with profiler.span('record_reflection'):
+            reflection_fixture.record_package(ghidra, options.record_reflection)
+
+    if options.stream:
+        # Extraction is interleaved with the consumer, and timed as part of it.
+        packages = type_extractor.Package.iter_from_package(
+            ghidra, workers=workers, extraction=extraction, cache=cache,
+        )
+    else:
+        with profiler.span('Package.from_package'):
+            ghidra_package = type_extractor.Package.from_package(
+                ghidra, workers=workers, extraction=extraction, cache=cache,
+            )
+        packages = type_formatter.get_all_packages((ghidra_package,))
+
+    if cache is not None:
+        packages = cache.iter_and_save(packages)
+    packages = iter_and_print_doc_stats(packages)
+
+    if options.dump_model:
+        with profiler.span('write_model_dump'):
+            model_dump.write_model_dump(options.dump_model, packages)
+        print('Run `python3 format_model.py {} {} --ghidra-version {}` to format the stubs'.format(
+            options.dump_model, pyi_root, getGhidraVersion(),
+        ))
+        return
+
+    if options.wheel and not options.shard:
+        with profiler.span('write_wheel'):
+            with WheelWriter(pyi_root, getGhidraVersion(), get_package_version()) as writer:
+                type_formatter.write_packages(writer, packages, stub_profile=options.stub_profile)
+                writer.write_file(
+                    'ghidra/ghidra_builtins.pyi', os.path.join(pyi_root, 'ghidra_builtins.pyi'),
+                )
+        print('Wrote {} ({} stubs, {} files, {} bytes). Run `pip install {}` to install it'.format(
+            writer.path, options.stub_profile, writer.file_count, writer.byte_count, writer.path,
+        ))
+        return
+
+    restore_package_folder(pyi_root)
+    with profiler.span('create_type_hints'):
+        type_formatter.write_type_hints(pyi_root, packages, stub_profile=options.stub_profile)
+
+    if options.shard:
+        print(
+            'Run `python3 merge_shards.py <pyi root> <shard roots...> --ghidra-version {}` '
+            'once all shards are done'.format(getGhidraVersion())
+        )
+        return
+
+    package_version = get_package_version()
+    with profiler.span('generate_package'):
+        generate_package(
+            pyi_root, getGhidraVersion(),
+            stub_version=package_version, stub_profile=options.stub_profile,
+        )
+
 
-    pythonscript_handler.create_mock(pyi_root, my_globals)
+def iter_and_print_doc_stats(packages):
+    # type: (Iterable[type_extractor.Package]) -> Iterator[type_extractor.Package]
+    """Pass the packages through, and print the doc cache statistics once all were consumed."""
+    for package in packages:
+        yield package
+    print(helper.class_doc_cache)
 
-    ghidra_package = type_extractor.Package.from_package(ghidra)
-    type_formatter.create_type_hints(pyi_root, ghidra_package)
 
+def get_package_version():
+    # type: () -> str
     package_version = "DEV"
     if isRunningHeadless():
         # We are running in an headless environment and this might be an automated CI build
@@ -49,7 +177,7 @@ def main():
             package_version = askString("Package version", "Please specify package version")
         except:
             pass
-    generate_package(pyi_root, getGhidraVersion(), stub_version=package_version)
+    return package_version
 
 if __name__ == '__main__':
     main()
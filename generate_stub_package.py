@@ -1,8 +1,31 @@
 import os
 import shutil
 
+PACKAGE_NAME = 'ghidra-stubs'
+AUTHOR = 'Tamir Bahar'
+URL = 'https://github.com/VDOO-Connected-Trust/ghidra-pyi-generator'
 
-def generate_package(pyi_root, ghidra_version, stub_version="DEV"):
+
+def restore_package_folder(pyi_root):
+    """Move the stubs of a previous run back in place, so they can be updated incrementally."""
+    stub_folder = os.path.join(pyi_root, 'ghidra-stubs')
+    package_folder = os.path.join(pyi_root, 'ghidra')
+    if os.path.isdir(stub_folder) and not os.path.exists(package_folder):
+        os.rename(stub_folder, package_folder)
+
+
+def get_tree_size(folder):
+    """Count the `.pyi` files under `folder`, and their bytes."""
+    file_count = byte_count = 0
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.endswith('.pyi'):
+                file_count += 1
+                byte_count += os.path.getsize(os.path.join(root, file))
+    return file_count, byte_count
+
+
+def generate_package(pyi_root, ghidra_version, stub_version="DEV", stub_profile='full'):
 
     setup_code = """
 from setuptools import setup
@@ -10,7 +33,7 @@ import os
 
 def find_stub_files():
     result = []
-    package = 'ghidra-stubs'
+    package = '{package_name}'
     for root, dirs, files in os.walk(package):
         for file in files:
             if file.endswith('.pyi'):
@@ -18,22 +41,35 @@ def find_stub_files():
                 result.append(file)
     return result
 
-setup(name= 'ghidra-stubs',
+setup(name= '{package_name}',
 version='{ghidra_version}.{stub_version}',
-author='Tamir Bahar',
-packages=['ghidra-stubs'],
-url="https://github.com/VDOO-Connected-Trust/ghidra-pyi-generator",
-package_data={{'ghidra-stubs': find_stub_files()}},
+author='{author}',
+packages=['{package_name}'],
+url="{url}",
+package_data={{'{package_name}': find_stub_files()}},
 long_description=open('README.md').read(),
 long_description_content_type='text/markdown',
 )
     """.format(ghidra_version=ghidra_version,
-               stub_version=stub_version)
+               stub_version=stub_version,
+               package_name=PACKAGE_NAME,
+               author=AUTHOR,
+               url=URL)
 
     stub_folder = os.path.join(pyi_root, 'ghidra-stubs')
     os.rename(os.path.join(pyi_root, 'ghidra'), stub_folder)
-    shutil.copy2(os.path.join(pyi_root, 'ghidra_builtins.pyi'), stub_folder)
+    builtins_path = os.path.join(pyi_root, 'ghidra_builtins.pyi')
+    if os.path.exists(builtins_path):
+        shutil.copy2(builtins_path, stub_folder)
+    else:
+        # Model dumps do not include the builtins, e.g. when formatting on another host.
+        print('Warning: {} not found, the package will not include the Ghidra builtins'.format(
+            builtins_path,
+        ))
     with open(os.path.join(pyi_root, 'setup.py'), 'w') as setup_file:
         setup_file.write(setup_code)
 
+    print('{} ({} stubs): {} files, {} bytes'.format(
+        PACKAGE_NAME, stub_profile, *get_tree_size(stub_folder)
+    ))
     print('Run `pip install {}` to install ghidra-stubs package'.format(pyi_root))
@@ -1,49 +1,93 @@
 from __future__ import print_function
 
 import zipfile
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from contextlib import closing
 import json
 import os
+import shutil
+import tempfile
+import threading
 
 import attr
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Union
 
-import java.lang
-from ghidra.framework import Application
+try:
+    from ghidra.framework import Application
+except ImportError:
+    # Outside of Ghidra only the model itself is usable, e.g. by `format_model.py`.
+    Application = None
 from basic_type import BasicType
+from manifest import get_fingerprint
 
 
-def get_jsondoc_basepath():
+def get_jsondoc_cache_dir():
     return os.path.join(
         Application.getUserCacheDirectory().getAbsolutePath(),
         'GhidraAPI_javadoc',
         Application.getApplicationVersion(),
-        'api',
     )
 
-def extract_jsondoc():
-    zip_location = os.path.join(Application.getInstallationDirectory().getAbsolutePath(), "docs/GhidraAPI_javadoc.zip")
-    extract_dir = os.path.join(
+
+def get_generator_cache_dir():
+    """Cache directory of this generator, for the running Ghidra version."""
+    return os.path.join(
         Application.getUserCacheDirectory().getAbsolutePath(),
-        'GhidraAPI_javadoc',
-        Application.getApplicationVersion())
+        'ghidra-pyi-generator',
+        Application.getApplicationVersion(),
+    )
 
-    zip_file = zipfile.ZipFile(zip_location)
-    zip_file.extractall(extract_dir)
 
-def are_docs_available():
-    return os.path.exists(get_jsondoc_basepath())
+def get_jsondoc_basepath():
+    return os.path.join(get_jsondoc_cache_dir(), 'api')
 
 
-def get_jsondoc(class_name):
-    path_without_ext = os.path.join(get_jsondoc_basepath(), class_name.replace('.', '/'))
-    json_path = '{}.json'.format(path_without_ext)
+def get_jsondoc_zip_path():
+    return os.path.join(
+        Application.getInstallationDirectory().getAbsolutePath(),
+        'docs/GhidraAPI_javadoc.zip',
+    )
 
+
+def extract_jsondoc(json_only=False):
+    """Extract the API docs zip into the user cache.
+
+    The docs are extracted next to their final location and then moved into place,
+    so an interrupted extraction is never mistaken for available docs.
+    """
+    extract_dir = get_jsondoc_cache_dir()
+    temp_dir = tempfile.mkdtemp(prefix='.extract-', dir=ensure_directory(extract_dir))
     try:
-        with open(json_path) as f:
-            return json.load(f)
-    except (IOError, KeyError):
-        pass
+        with closing(zipfile.ZipFile(get_jsondoc_zip_path())) as zip_file:
+            if json_only:
+                for info in zip_file.infolist():
+                    if info.filename.endswith('.json'):
+                        zip_file.extract(info, temp_dir)
+            else:
+                zip_file.extractall(temp_dir)
+
+        os.rename(os.path.join(temp_dir, 'api'), get_jsondoc_basepath())
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    reset_jsondoc_source()
+
+
+def ensure_directory(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path
+
+
+def are_docs_available():
+    return os.path.exists(get_jsondoc_basepath())
+
+
+def get_jsondoc_index_path():
+    return os.path.join(
+        get_jsondoc_cache_dir(),
+        'jsondoc.v{}.index'.format(JsonDocIndex.VERSION),
+    )
 
 
 def json_path_to_class_name(root, name, jsondoc_basepath):
@@ -54,12 +98,263 @@ def json_path_to_class_name(root, name, jsondoc_basepath):
     return str(class_name)
 
 
+class JsonDocDirectory(object):
+    """jsondoc files extracted under a directory, one file per class."""
+
+    def __init__(self, basepath):
+        self.basepath = basepath
+
+    @property
+    def class_names(self):
+        for root, _dirs, names in os.walk(self.basepath):
+            for name in names:
+                if name.endswith('.json'):
+                    yield json_path_to_class_name(root, name, self.basepath)
+
+    def _get_path(self, class_name):
+        path_without_ext = os.path.join(self.basepath, class_name.replace('.', '/'))
+        return '{}.json'.format(path_without_ext)
+
+    def read(self, class_name):
+        # type: (str) -> Optional[bytes]
+        try:
+            with open(self._get_path(class_name), 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def get(self, class_name):
+        try:
+            with open(self._get_path(class_name)) as f:
+                return json.load(f)
+        except (IOError, KeyError):
+            pass
+
+    def close(self):
+        pass
+
+
+class JsonDocZip(object):
+    """jsondoc files read straight from the API docs zip, without extracting it.
+
+    Members are located through the zip's central directory,
+    and read through a single shared handle.
+    """
+    PREFIX = 'api/'
+
+    def __init__(self, zip_path):
+        self.zip_file = zipfile.ZipFile(zip_path)
+        self._lock = threading.Lock()
+        self.members = {}  # type: Dict[str, zipfile.ZipInfo]
+        for info in self.zip_file.infolist():
+            if info.filename.startswith(self.PREFIX) and info.filename.endswith('.json'):
+                class_path = os.path.splitext(info.filename[len(self.PREFIX):])[0]
+                self.members[str(class_path.replace('/', '.'))] = info
+
+    @property
+    def class_names(self):
+        return list(self.members)
+
+    def read(self, class_name):
+        # type: (str) -> Optional[bytes]
+        info = self.members.get(class_name)
+        if info is None:
+            return None
+        with self._lock:
+            return self.zip_file.read(info)
+
+    def get(self, class_name):
+        data = self.read(class_name)
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def close(self):
+        self.zip_file.close()
+
+
+class JsonDocIndex(object):
+    """All jsondoc files of a Ghidra version, packed into a single seekable file.
+
+    Layout:
+        <MAGIC> <VERSION>\n
+        <raw jsondoc of each class, concatenated>
+        <JSON table of class name -> [offset, length]>
+        <20-digit offset of the table>
+    """
+    MAGIC = b'GHIDRA-PYI-JSONDOC-INDEX'
+    VERSION = 1
+    TRAILER_SIZE = 20
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        try:
+            header = self._file.readline().split()
+            if header != [self.MAGIC, str(self.VERSION).encode('ascii')]:
+                raise ValueError('Unsupported jsondoc index: {}'.format(path))
+
+            self._file.seek(-self.TRAILER_SIZE, os.SEEK_END)
+            table_offset = int(self._file.read(self.TRAILER_SIZE))
+            self._file.seek(table_offset)
+            table_size = os.path.getsize(path) - table_offset - self.TRAILER_SIZE
+            self.table = json.loads(self._file.read(table_size))  # type: Dict[str, List[int]]
+        except Exception:
+            self._file.close()
+            raise
+
+    @property
+    def class_names(self):
+        return [str(class_name) for class_name in self.table]
+
+    def read(self, class_name):
+        # type: (str) -> Optional[bytes]
+        entry = self.table.get(class_name)
+        if entry is None:
+            return None
+
+        offset, length = entry
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def get(self, class_name):
+        data = self.read(class_name)
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def close(self):
+        self._file.close()
+
+    @classmethod
+    def build(cls, source, index_path):
+        """Pack all the jsondoc of `source` into `index_path`."""
+        ensure_directory(os.path.dirname(index_path))
+        temp_path = '{}.tmp'.format(index_path)
+        table = {}
+        with open(temp_path, 'wb') as index:
+            index.write(cls.MAGIC + b' ' + str(cls.VERSION).encode('ascii') + b'\n')
+            for class_name in source.class_names:
+                data = source.read(class_name)
+                if data is None:
+                    continue
+
+                table[class_name] = [index.tell(), len(data)]
+                index.write(data)
+
+            table_offset = index.tell()
+            index.write(json.dumps(table, sort_keys=True).encode('ascii'))
+            index.write('{:0{}d}'.format(table_offset, cls.TRAILER_SIZE).encode('ascii'))
+
+        # Rename only once complete, so a partial index is never picked up.
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        os.rename(temp_path, index_path)
+
+
+_jsondoc_source = None  # type: Optional[Union[JsonDocIndex, JsonDocDirectory, JsonDocZip]]
+_jsondoc_source_lock = threading.Lock()
+
+
+def _open_jsondoc_source(use_index=True):
+    if use_index and is_jsondoc_index_available():
+        try:
+            return JsonDocIndex(get_jsondoc_index_path())
+        except (IOError, ValueError):
+            pass
+
+    if are_docs_available():
+        return JsonDocDirectory(get_jsondoc_basepath())
+
+    if os.path.exists(get_jsondoc_zip_path()):
+        return JsonDocZip(get_jsondoc_zip_path())
+
+    return None
+
+
+def get_jsondoc_source():
+    """Get the shared jsondoc source.
+
+    In order of preference: the packed index, the extracted docs, and the docs zip.
+    """
+    global _jsondoc_source
+    if _jsondoc_source is None:
+        with _jsondoc_source_lock:
+            if _jsondoc_source is None:
+                _jsondoc_source = _open_jsondoc_source()
+    return _jsondoc_source
+
+
+def reset_jsondoc_source():
+    global _jsondoc_source
+    if _jsondoc_source is not None:
+        _jsondoc_source.close()
+        _jsondoc_source = None
+
+
+def set_jsondoc_source(source):
+    """Replace the shared jsondoc source, e.g. with the docs of a reflection fixture."""
+    global _jsondoc_source
+    reset_jsondoc_source()
+    _jsondoc_source = source
+    class_doc_cache.clear()
+
+
+def build_jsondoc_index():
+    reset_jsondoc_source()
+    source = _open_jsondoc_source(use_index=False)
+    if source is None:
+        raise IOError('No API docs found in {}'.format(get_jsondoc_zip_path()))
+
+    try:
+        JsonDocIndex.build(source, get_jsondoc_index_path())
+    finally:
+        source.close()
+
+
+def is_jsondoc_index_available():
+    return os.path.exists(get_jsondoc_index_path())
+
+
+def get_jsondoc(class_name):
+    source = get_jsondoc_source()
+    if source is None:
+        return None
+    return source.get(class_name)
+
+
+def read_jsondoc(class_name):
+    # type: (str) -> Optional[bytes]
+    source = get_jsondoc_source()
+    if source is None:
+        return None
+    return source.read(class_name)
+
+
+def get_jsondoc_fingerprint(class_name):
+    # type: (str) -> str
+    """The fingerprint of the docs of a class, without parsing them, or '' if it has no docs."""
+    data = read_jsondoc(class_name)
+    if data is None:
+        return ''
+    return get_fingerprint(data)
+
+
 def get_jsondoc_classes():
-    jsondoc_basepath = get_jsondoc_basepath()
-    for root, _dirs, names in os.walk(jsondoc_basepath):
-        for name in names:
-            if name.endswith('.json'):
-                yield json_path_to_class_name(root, name, jsondoc_basepath)
+    source = get_jsondoc_source()
+    if source is None:
+        return iter(())
+    return iter(source.class_names)
+
+
+def to_native_string(text):
+    # type: (Union[str, bytes]) -> str
+    """Docs are formatted as byte strings under Jython, and as text under CPython 3."""
+    if str is bytes:
+        return text.encode('utf8')
+    return text
 
 
 @attr.s
@@ -76,16 +371,44 @@ class ParamDoc(object):
 
     @property
     def comment(self):
-        return self.jsondoc['comment'].encode("utf8")
+        return to_native_string(self.jsondoc['comment'])
 
 
 class MethodDoc(object):
-    def __init__(self, jsondoc):
+    """The docs of a method, shared by the docs of all the classes that inherit it.
+
+    `class_name` and `position` locate the method in the docs of the class that declares it.
+    """
+    __slots__ = ('jsondoc', 'class_name', 'position', '_param_types', '_javadoc')
+
+    def __init__(self, jsondoc, class_name=None, position=None):
+        # type: (dict, Optional[str], Optional[int]) -> None
         self.jsondoc = jsondoc
+        self.class_name = class_name
+        self.position = position
+        self._param_types = None  # type: Optional[List[BasicType]]
+        self._javadoc = None  # type: Optional[str]
+
+    @property
+    def params(self):
+        # type: () -> List[ParamDoc]
+        return [ParamDoc(param) for param in self.jsondoc['params']]
+
+    @property
+    def param_types(self):
+        # type: () -> List[BasicType]
+        if self._param_types is None:
+            self._param_types = [param.type for param in self.params]
+        return self._param_types
+
+    @property
+    def signature(self):
+        # type: () -> Tuple[str, ...]
+        return tuple(param['type_long'] for param in self.jsondoc['params'])
 
     @property
     def comment(self):
-        return self.jsondoc['comment'].encode("utf8")
+        return to_native_string(self.jsondoc['comment'])
 
     @property
     def return_type(self):
@@ -93,16 +416,62 @@ class MethodDoc(object):
 
     @property
     def javadoc(self):
-        return self.jsondoc['javadoc'].encode("utf8")
+        # Encoded once, as it is shared by the overloads of every class that inherits the method.
+        if self._javadoc is None:
+            self._javadoc = to_native_string(self.jsondoc['javadoc'])
+        return self._javadoc
 
     @property
-    def params(self):
-        return map(ParamDoc, self.jsondoc['params'])
+    def ref(self):
+        # type: () -> DocRef
+        return DocRef(class_name=self.class_name, position=self.position)
+
+
+@attr.s(frozen=True, slots=True)
+class DocRef(object):
+    """A docstring left in the doc store until it is formatted, see `resolve_docstring`.
+
+    The javadoc of the method at `position` in the docs of `class_name`,
+    or their comment without a position.
+    """
+    class_name = attr.ib()  # type: str
+    position = attr.ib(default=None)  # type: Optional[int]
+
+    def resolve(self):
+        # type: () -> str
+        docs = get_class_doc(self.class_name)
+        if docs is None:
+            return ''
+        if self.position is None:
+            return docs.comment
+        return docs.method_docs[self.position].javadoc
+
+
+def resolve_docstring(docstring):
+    # type: (Union[str, DocRef, None]) -> Optional[str]
+    if isinstance(docstring, DocRef):
+        return docstring.resolve()
+    return docstring
+
+
+def get_docstring_key(docstring):
+    # type: (Union[str, DocRef, None]) -> Tuple[str, str]
+    """Identify a docstring by its text, or if it was left in the doc store, by where it is.
+
+    Docstrings left in the doc store are identified with the fingerprint of their docs,
+    without reading their text.
+    """
+    if isinstance(docstring, DocRef):
+        docs = get_class_doc(docstring.class_name)
+        location = '{}#{}'.format(docstring.class_name, docstring.position)
+        return location, docs.fingerprint if docs is not None else ''
+    return '', docstring or ''
 
 
 @attr.s
 class OverloadSetDoc(object):
-    overloads_jsondoc = attr.ib()
+    overloads = attr.ib()  # type: Tuple[MethodDoc, ...]
+    _index = attr.ib(default=None, init=False, repr=False, eq=False)
 
     @staticmethod
     def is_matching_overload(required_args, provided_args):
@@ -116,53 +485,84 @@ class OverloadSetDoc(object):
             in zip(required_args, provided_args)
         )
 
+    @staticmethod
+    def get_signature_key(param_types):
+        # type: (List[BasicType]) -> Tuple[str, ...]
+        return tuple(param_type.overload_key for param_type in param_types)
+
+    @property
+    def index(self):
+        # type: () -> Dict[Tuple[str, ...], MethodDoc]
+        """The overloads by signature key. The first overload wins, as in `is_matching_overload`"""
+        if self._index is None:
+            index = {}
+            for method_doc in self.overloads:
+                index.setdefault(self.get_signature_key(method_doc.param_types), method_doc)
+            self._index = index
+        return self._index
+
     def get_overload(self, param_types):
         # type: (List[BasicType]) -> Optional[MethodDoc]
-        for overload in self.overloads_jsondoc:
-            doc_param_types = [
-                BasicType.from_java(param['type_long']) for param in overload['params']
-            ]
-            if self.is_matching_overload(doc_param_types, param_types):
-                return MethodDoc(overload)
-        return None
+        return self.index.get(self.get_signature_key(param_types))
+
+
+_overload_tables_in_progress = threading.local()
+
+
+def strip_type_arguments(class_name):
+    # type: (str) -> str
+    return class_name.partition('<')[0]
 
 
 class ClassDoc(object):
     def __init__(self, class_name):
         self.class_name = class_name  # type: str
-        self.jsondoc = get_jsondoc(class_name)
+        data = read_jsondoc(class_name)
 
-        if self.jsondoc is None:
+        if data is None:
             raise KeyError('No docs for {}'.format(class_name))
 
+        self.jsondoc = json.loads(data)
+        # Identifies the docs of the class, e.g. in the fingerprints of models that reference them.
+        self.fingerprint = get_fingerprint(data)
+
+        self.method_docs = [
+            MethodDoc(method, class_name, position)
+            for position, method in enumerate(self.jsondoc['methods'])
+        ]
         self.methods = self._map_methods()
+        self._comment = None  # type: Optional[str]
+        self._overload_table = None  # type: Optional[Dict[str, Tuple[MethodDoc, ...]]]
+        self._overload_sets = {}  # type: Dict[str, OverloadSetDoc]
 
     def _map_methods(self):
         methods = defaultdict(list)
-        for method in self.jsondoc['methods']:
-            methods[method['name']].append(method)
+        for method_doc in self.method_docs:
+            methods[method_doc.jsondoc['name']].append(method_doc)
 
         return methods
 
     @property
     def extends_doc(self):
-        if hasattr(self, '_extends_doc'):
-            return self._extends_doc
-
-        self._extends_doc = ClassDoc(self.extends)
-        return self._extends_doc
+        # type: () -> Optional[ClassDoc]
+        if self.extends is None:
+            return None
+        return get_class_doc(strip_type_arguments(self.extends))
 
     @property
-    def implements_doc(self):
-        if hasattr(self, '_implemented_doc'):
-            return self._implemented_doc
-
-        self._implemented_doc = ClassDoc(self.extends)
-        return self._implemented_doc
+    def implements_docs(self):
+        # type: () -> List[ClassDoc]
+        docs = (
+            get_class_doc(strip_type_arguments(interface))
+            for interface in self.implements or ()
+        )
+        return [doc for doc in docs if doc is not None]
 
     @property
     def comment(self):
-        return self.jsondoc['comment'].encode("utf8")
+        if self._comment is None:
+            self._comment = to_native_string(self.jsondoc['comment'])
+        return self._comment
 
     @property
     def extends(self):
@@ -176,18 +576,154 @@ class ClassDoc(object):
     def name(self):
         return self.jsondoc['name']
 
-    def _get_overload_set(self, name):
-        try:
-            extend_overload_set = self.extends_doc._get_overload_set(name)
-        except (java.lang.Throwable, Exception):
-            extend_overload_set = []
+    @property
+    def overload_table(self):
+        # type: () -> Dict[str, Tuple[MethodDoc, ...]]
+        """All the method overloads of the class, including inherited ones, by method name.
+
+        Overloads declared closer to the class come first,
+        and inherited overloads with an already-seen signature are dropped.
+        The table is built once, and reuses the tables of the superclass and interfaces.
+        """
+        if self._overload_table is None:
+            # Guard against cycles in broken docs while the table is being built.
+            # The guard is per-thread, so other threads never see a partial table.
+            building = getattr(_overload_tables_in_progress, 'class_names', None)
+            if building is None:
+                building = _overload_tables_in_progress.class_names = set()
+            if self.class_name in building:
+                return {}
+
+            building.add(self.class_name)
+            try:
+                self._overload_table = self._build_overload_table()
+            finally:
+                building.discard(self.class_name)
+        return self._overload_table
+
+    def _build_overload_table(self):
+        # type: () -> Dict[str, Tuple[MethodDoc, ...]]
+        table = {name: tuple(overloads) for name, overloads in self.methods.items()}
+
+        inherited_docs = [self.extends_doc] + self.implements_docs
+        for inherited_doc in inherited_docs:
+            if inherited_doc is None:
+                continue
+
+            for name, overloads in inherited_doc.overload_table.items():
+                if name == '<init>':
+                    # Constructors are not inherited.
+                    continue
+
+                if name not in table:
+                    table[name] = overloads
+                    continue
+
+                signatures = set(overload.signature for overload in table[name])
+                new_overloads = tuple(
+                    overload for overload in overloads
+                    if overload.signature not in signatures
+                )
+                if new_overloads:
+                    table[name] += new_overloads
+
+        return table
+
+    def get_overload_set(self, name):
+        # type: (str) -> OverloadSetDoc
+        overload_set = self._overload_sets.get(name)
+        if overload_set is None:
+            overload_set = self._overload_sets.setdefault(
+                name, OverloadSetDoc(self.overload_table.get(name, ())),
+            )
+        return overload_set
+
+
+class ClassDocCache(object):
+    """Process-wide LRU cache of `ClassDoc`s by class name.
+
+    Classes without docs are cached as well, so they are only looked up once.
+    The cache is thread-safe. Docs are loaded outside the lock,
+    so concurrent misses on the same class may load it twice.
+    """
+
+    def __init__(self, maxsize=4096):
+        # type: (int) -> None
+        self.maxsize = maxsize
+        self._docs = OrderedDict()  # type: OrderedDict[str, Optional[ClassDoc]]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, class_name):
+        # type: (str) -> Optional[ClassDoc]
+        with self._lock:
+            try:
+                docs = self._docs.pop(class_name)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._docs[class_name] = docs
+                return docs
 
         try:
-            implements_overload_set = self.implements_doc._get_overload_set(name)
-        except (java.lang.Throwable, Exception):
-            implements_overload_set = []
+            docs = ClassDoc(class_name)
+        except KeyError:
+            docs = None
 
-        return self.methods.get(name, []) + extend_overload_set + implements_overload_set
+        with self._lock:
+            self._docs[class_name] = docs
+            if len(self._docs) > self.maxsize:
+                self._docs.popitem(last=False)
 
-    def get_overload_set(self, name):
-        return OverloadSetDoc(self._get_overload_set(name))
+        return docs
+
+    def discard(self, class_name):
+        # type: (str) -> None
+        with self._lock:
+            self._docs.pop(class_name, None)
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+
+    def __str__(self):
+        return 'ClassDoc cache: {} hits, {} misses, {} cached'.format(
+            self.hits, self.misses, len(self._docs),
+        )
+
+
+class_doc_cache = ClassDocCache()
+
+
+def get_class_doc(class_name):
+    # type: (str) -> Optional[ClassDoc]
+    """Get the docs of a class from the shared cache, or `None` if it has no docs."""
+    return class_doc_cache.get(class_name)
+
+
+def get_hierarchy_docs_fingerprints(class_name):
+    # type: (str) -> Dict[str, str]
+    """The fingerprints of the docs of a class and of all its supertypes, by class name.
+
+    Those are all the docs the model of the class is extracted from,
+    see `get_jsondoc_fingerprint`.
+    """
+    fingerprints = {}  # type: Dict[str, str]
+    stack = [class_name]
+    while stack:
+        name = stack.pop()
+        if name in fingerprints:
+            continue
+
+        docs = get_class_doc(name)
+        if docs is None:
+            fingerprints[name] = ''
+            continue
+
+        fingerprints[name] = docs.fingerprint
+        if docs.extends is not None:
+            stack.append(strip_type_arguments(docs.extends))
+        stack.extend(strip_type_arguments(interface) for interface in docs.implements or ())
+    return fingerprints
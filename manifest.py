@@ -0,0 +1,105 @@
+"""Per-file fingerprints of a generated `.pyi` tree, for incremental regeneration."""
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+
+from typing import Any, Dict, Optional, Set
+
+
+def get_fingerprint(data):
+    # type: (Any) -> str
+    if not isinstance(data, bytes):
+        data = data.encode('utf8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def get_module_fingerprint(module):
+    """Fingerprint the source of a module, so that code changes invalidate the manifest."""
+    path = module.__file__
+    for compiled_suffix in ('$py.class', '.pyc', '.pyo'):
+        if path.endswith(compiled_suffix):
+            path = path[:-len(compiled_suffix)] + '.py'
+            break
+
+    with open(path, 'rb') as f:
+        return get_fingerprint(f.read())
+
+
+class Manifest(object):
+    """Records, for every generated file, the fingerprints of its model and of its text.
+
+    Files whose model did not change are neither formatted nor written,
+    and files whose text did not change are not rewritten, to keep their mtimes.
+    Files that were generated before but not during this run are removed on `save`.
+    """
+    FILENAME = '.ghidra-pyi-manifest.json'
+    VERSION = 1
+
+    def __init__(self, root, format_key):
+        # type: (str, str) -> None
+        self.root = root
+        self.format_key = format_key
+        self.previous = {}  # type: Dict[str, Dict[str, str]]
+        self.current = {}  # type: Dict[str, Dict[str, str]]
+        self.written = set()  # type: Set[str]
+
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+        except (IOError, ValueError):
+            return
+
+        if manifest.get('version') == self.VERSION and manifest.get('format_key') == format_key:
+            self.previous = manifest['files']
+
+    @property
+    def path(self):
+        return os.path.join(self.root, self.FILENAME)
+
+    def _exists(self, relative_path):
+        return os.path.exists(os.path.join(self.root, relative_path))
+
+    def is_unchanged(self, relative_path, model_fingerprint):
+        # type: (str, str) -> bool
+        """Check if a file is up to date with its model, and keep it if so."""
+        entry = self.previous.get(relative_path)
+        if entry is None or entry['model'] != model_fingerprint:
+            return False
+
+        if not self._exists(relative_path):
+            return False
+
+        self.current[relative_path] = entry
+        return True
+
+    def record(self, relative_path, model_fingerprint, text):
+        # type: (str, Optional[str], str) -> bool
+        """Record the new text of a file, and return whether it needs to be written."""
+        text_fingerprint = get_fingerprint(text)
+        self.current[relative_path] = {'model': model_fingerprint, 'text': text_fingerprint}
+
+        entry = self.previous.get(relative_path)
+        if entry is not None and entry['text'] == text_fingerprint and self._exists(relative_path):
+            return False
+
+        self.written.add(relative_path)
+        return True
+
+    def remove_stale(self):
+        for relative_path in set(self.previous) - set(self.current):
+            path = os.path.join(self.root, relative_path)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save(self):
+        self.remove_stale()
+        with open(self.path, 'w') as f:
+            json.dump(
+                {'version': self.VERSION, 'format_key': self.format_key, 'files': self.current},
+                f,
+                sort_keys=True,
+            )
+
+        print('{} of {} files changed'.format(len(self.written), len(self.current)))
@@ -0,0 +1,192 @@
+"""Merge the `.pyi` trees of sharded runs into a single tree, under CPython 3.
+
+Every shard is generated into its own directory, with `GHIDRA_PYI_SHARD=<index>/<count>`:
+
+    python3 merge_shards.py <pyi root> <shard root>... [--ghidra-version VERSION]
+
+Class stubs are taken from the shard that generated them,
+and every `__init__.pyi` is rebuilt from the merged tree.
+With `--ghidra-version`, the stub package is generated as well, with the stub profile of the shards,
+and with `--wheel` as well, the stubs are merged straight into a wheel of the package instead.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import shutil
+
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import type_formatter
+from generate_stub_package import generate_package, restore_package_folder
+from manifest import Manifest
+from stub_writer import ImportIndex, StubWriter
+from wheel_writer import WheelWriter
+
+BUILTINS_FILENAME = 'ghidra_builtins.pyi'
+
+
+def read_shard_manifest(shard_root):
+    # type: (str) -> Dict
+    try:
+        with open(os.path.join(shard_root, Manifest.FILENAME)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def iter_shard_files(shard_root):
+    # type: (str) -> Iterator[str]
+    """Iterate over the relative paths of the stubs of a shard, in a stable order."""
+    for directory, directories, filenames in os.walk(os.path.join(shard_root, 'ghidra')):
+        directories.sort()
+        for filename in sorted(filenames):
+            if filename.endswith('.pyi'):
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, shard_root).replace(os.sep, '/')
+
+
+def read_text(path):
+    # type: (str) -> str
+    with io.open(path, encoding='utf8') as f:
+        return f.read()
+
+
+def get_merged_imports(class_paths, package_paths):
+    # type: (Iterable[str], Set[str]) -> ImportIndex
+    """Rebuild the imports of every `__init__.pyi`, as `write_type_hints` writes them."""
+    import_index = ImportIndex()
+    for package_path in package_paths:
+        import_index.add(package_path, [])
+
+        parent_path, _sep, name = package_path.rpartition('/')
+        if parent_path in package_paths:
+            import_index.add(parent_path, ['from . import {0} as {0}'.format(name)])
+
+    for class_path in class_paths:
+        package_path, _sep, filename = class_path.rpartition('/')
+        class_name = filename[:-len('.pyi')]
+        import_index.add(package_path, ['from .{0} import {0} as {0}'.format(class_name)])
+
+    return import_index
+
+
+def get_stub_profiles_by_format_key():
+    # type: () -> Dict[str, str]
+    return dict(
+        (type_formatter.get_format_key(stub_profile), stub_profile)
+        for stub_profile in type_formatter.STUB_PROFILES
+    )
+
+
+def merge_shards(root, shard_roots, wheel_writer=None):
+    # type: (str, List[str], Optional[WheelWriter]) -> str
+    """Merge the shards under `root`, or into `wheel_writer` if set.
+
+    Returns the stub profile the shards were generated with.
+    """
+    stub_profiles = get_stub_profiles_by_format_key()
+    format_key = None  # type: Optional[str]
+    sources = {}  # type: Dict[str, Tuple[str, Optional[str]]]
+    package_paths = set()  # type: Set[str]
+
+    for shard_root in shard_roots:
+        shard_manifest = read_shard_manifest(shard_root)
+        shard_format_key = shard_manifest.get('format_key')
+        if shard_format_key not in stub_profiles:
+            raise ValueError(
+                '{} was not generated by this version of the generator'.format(shard_root)
+            )
+        if format_key is not None and shard_format_key != format_key:
+            raise ValueError('{} was generated with another stub profile than {}'.format(
+                shard_root, shard_roots[0],
+            ))
+        format_key = shard_format_key
+
+        shard_files = shard_manifest['files']
+        for relative_path in iter_shard_files(shard_root):
+            package_path, _sep, filename = relative_path.rpartition('/')
+            if filename == '__init__.pyi':
+                package_paths.add(package_path)
+                continue
+
+            source = sources.get(relative_path)
+            if source is not None:
+                other_text = read_text(os.path.join(source[0], relative_path))
+                if other_text != read_text(os.path.join(shard_root, relative_path)):
+                    raise ValueError('{} differs between {} and {}'.format(
+                        relative_path, source[0], shard_root,
+                    ))
+                continue
+
+            entry = shard_files.get(relative_path) or {}
+            sources[relative_path] = (shard_root, entry.get('model'))
+
+    def _write_files(writer, manifest=None):
+        for relative_path in sorted(sources):
+            shard_root, model_fingerprint = sources[relative_path]
+            pyi_content = read_text(os.path.join(shard_root, relative_path))
+            if manifest is None or manifest.record(relative_path, model_fingerprint, pyi_content):
+                writer.write(relative_path, pyi_content)
+
+        import_index = get_merged_imports(sorted(sources), package_paths)
+        type_formatter.write_imports(writer, import_index, manifest)
+
+    builtins_paths = [
+        os.path.join(shard_root, BUILTINS_FILENAME) for shard_root in shard_roots
+        if os.path.exists(os.path.join(shard_root, BUILTINS_FILENAME))
+    ]
+
+    if wheel_writer is not None:
+        _write_files(wheel_writer)
+        if builtins_paths:
+            wheel_writer.write_file('ghidra/' + BUILTINS_FILENAME, builtins_paths[0])
+        return stub_profiles[format_key]
+
+    manifest = Manifest(root, format_key)
+    with StubWriter(root) as writer:
+        _write_files(writer, manifest)
+    manifest.save()
+
+    if builtins_paths:
+        shutil.copyfile(builtins_paths[0], os.path.join(root, BUILTINS_FILENAME))
+    return stub_profiles[format_key]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pyi_root', help='.pyi root directory')
+    parser.add_argument('shard_roots', nargs='+', help='.pyi root directories of the shards')
+    parser.add_argument('--ghidra-version',
+                        help='Generate the stub package for this Ghidra version')
+    parser.add_argument('--package-version', default='DEV', help='Version of the stub package')
+    parser.add_argument('--wheel', action='store_true',
+                        help='Merge straight into a wheel of the stub package. '
+                             'Requires --ghidra-version.')
+    args = parser.parse_args()
+
+    if args.wheel:
+        if not args.ghidra_version:
+            parser.error('--wheel requires --ghidra-version')
+        with WheelWriter(args.pyi_root, args.ghidra_version, args.package_version) as writer:
+            merge_shards(args.pyi_root, args.shard_roots, wheel_writer=writer)
+        print('Wrote {} ({} files, {} bytes)'.format(
+            writer.path, writer.file_count, writer.byte_count,
+        ))
+        return
+
+    restore_package_folder(args.pyi_root)
+    stub_profile = merge_shards(args.pyi_root, args.shard_roots)
+    print('Merged {} shards'.format(len(args.shard_roots)))
+
+    if args.ghidra_version:
+        generate_package(
+            args.pyi_root, args.ghidra_version,
+            stub_version=args.package_version, stub_profile=stub_profile,
+        )
+
+
+if __name__ == '__main__':
+    main()
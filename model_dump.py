@@ -0,0 +1,207 @@
+"""A portable dump of the extracted API model.
+
+The dump is a JSON-lines file: a header line, followed by one line per package.
+It can be written by the Jython script, and formatted later by `format_model.py` under CPython.
+Paths ending with `.gz` are gzip-compressed.
+"""
+import gzip
+import json
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from basic_type import BasicType
+from helper import DocRef, resolve_docstring
+from type_extractor import Class, Field, Modifier, Overload, OverloadSet, Package, Property
+from version import PYI_VERSION
+
+DUMP_FORMAT = 'ghidra-pyi-model'
+DUMP_VERSION = 1
+
+
+def dump_type(basic_type):
+    # type: (Optional[BasicType]) -> Optional[List[Any]]
+    if basic_type is None:
+        return None
+
+    # The builtins module is `__builtin__` in Jython and `builtins` in CPython 3.
+    module = None if basic_type.is_builtin else basic_type.module
+    return [basic_type.name, module, basic_type.is_array, basic_type.is_iterator]
+
+
+def load_type(data):
+    # type: (Optional[List[Any]]) -> Optional[BasicType]
+    if data is None:
+        return None
+
+    name, module, is_array, is_iterator = data
+    if module is None:
+        module = str.__module__
+    return BasicType.intern(
+        BasicType(name=str(name), module=str(module), is_array=is_array, is_iterator=is_iterator)
+    )
+
+
+def dump_docstring(docstring, keep_refs=False):
+    # type: (Union[str, DocRef, None], bool) -> Any
+    """The text of a docstring, or with `keep_refs`, where it was left in the doc store."""
+    if keep_refs and isinstance(docstring, DocRef):
+        return {'ref': [docstring.class_name, docstring.position]}
+    return resolve_docstring(docstring)
+
+
+def load_docstring(data):
+    # type: (Any) -> Union[str, DocRef, None]
+    if isinstance(data, dict):
+        class_name, position = data['ref']
+        return DocRef(class_name=str(class_name), position=position)
+    return data
+
+
+def dump_overload_set(overload_set, keep_refs=False):
+    # type: (OverloadSet, bool) -> Dict[str, Any]
+    return {
+        'name': overload_set.name,
+        'is_constructor': overload_set.is_constructor,
+        'overloads': [
+            {
+                'return_type': dump_type(overload.return_type),
+                'argument_types': [dump_type(t) for t in overload.argument_types],
+                'argument_names': list(overload.argument_names),
+                'is_static': overload.is_static,
+                'docstring': dump_docstring(overload.docstring, keep_refs),
+            }
+            for overload in overload_set.overloads
+        ],
+    }
+
+
+def load_overload_set(data):
+    # type: (Dict[str, Any]) -> OverloadSet
+    return OverloadSet(
+        name=data['name'],
+        is_constructor=data['is_constructor'],
+        overloads=[
+            Overload(
+                return_type=load_type(overload['return_type']),
+                argument_types=[load_type(t) for t in overload['argument_types']],
+                argument_names=overload['argument_names'],
+                is_static=overload['is_static'],
+                docstring=load_docstring(overload['docstring']),
+            )
+            for overload in data['overloads']
+        ],
+    )
+
+
+def dump_class(cls, keep_refs=False):
+    # type: (Class, bool) -> Dict[str, Any]
+    return {
+        'name': cls.name,
+        'methods': [dump_overload_set(method, keep_refs) for method in cls.methods],
+        'constructors': [dump_overload_set(ctor, keep_refs) for ctor in cls.constructors],
+        'properties': [
+            [prop.name, dump_type(prop.getter_type), dump_type(prop.setter_type)]
+            for prop in cls.properties
+        ],
+        'fields': [
+            [field.name, dump_type(field.my_type), field.modifiers.modifiers,
+             field.value_repr, field.has_value]
+            for field in cls.fields
+        ],
+        'nested_classes': [
+            dump_class(nested_class, keep_refs) for nested_class in cls.nested_classes
+        ],
+        'is_iterable': cls.is_iterable,
+        'bases': [dump_type(base) for base in cls.bases],
+        'docstring': dump_docstring(cls.docstring, keep_refs),
+    }
+
+
+def load_class(data):
+    # type: (Dict[str, Any]) -> Class
+    return Class(
+        name=data['name'],
+        methods=[load_overload_set(method) for method in data['methods']],
+        constructors=[load_overload_set(ctor) for ctor in data['constructors']],
+        properties=[
+            Property(
+                name=name, getter_type=load_type(getter_type), setter_type=load_type(setter_type),
+            )
+            for name, getter_type, setter_type in data['properties']
+        ],
+        fields=[
+            Field(
+                name=name,
+                my_type=load_type(my_type),
+                modifiers=Modifier(modifiers),
+                value_repr=value_repr,
+                has_value=has_value,
+            )
+            for name, my_type, modifiers, value_repr, has_value in data['fields']
+        ],
+        nested_classes=[load_class(nested_class) for nested_class in data['nested_classes']],
+        is_iterable=data['is_iterable'],
+        bases=[load_type(base) for base in data['bases']],
+        docstring=load_docstring(data['docstring']),
+    )
+
+
+def dump_package(package, keep_refs=False):
+    # type: (Package, bool) -> Dict[str, Any]
+    """Dump a single package. Sub-packages are referenced by name, and dumped on their own.
+
+    With `keep_refs`, docstrings left in the doc store are dumped as references to it,
+    which are only valid with the same API docs.
+    """
+    return {
+        'name': package.name,
+        'classes': [dump_class(cls, keep_refs) for cls in package.classes],
+        'packages': [subpackage.name for subpackage in package.packages],
+    }
+
+
+def load_package(data):
+    # type: (Dict[str, Any]) -> Package
+    return Package(
+        name=str(data['name']),
+        classes=[load_class(cls) for cls in data['classes']],
+        packages=[Package(name=str(name), classes=[], packages=[]) for name in data['packages']],
+    )
+
+
+def open_dump(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 'b')
+    return open(path, mode + 'b')
+
+
+def get_header():
+    return {'format': DUMP_FORMAT, 'version': DUMP_VERSION, 'generator': PYI_VERSION}
+
+
+def write_model_dump(path, packages):
+    # type: (str, Iterable[Package]) -> None
+    """Dump packages one line at a time, so a stream of packages is never held in memory."""
+    with open_dump(path, 'w') as f:
+        f.write(json.dumps(get_header()).encode('ascii') + b'\n')
+        for package in packages:
+            f.write(json.dumps(dump_package(package), sort_keys=True).encode('ascii') + b'\n')
+
+
+def iter_model_dump_lines(path):
+    # type: (str) -> Iterator[bytes]
+    """Iterate over the raw package lines of a dump, after validating its header."""
+    with open_dump(path, 'r') as f:
+        header = json.loads(f.readline().decode('ascii'))
+        if header.get('format') != DUMP_FORMAT or header.get('version') != DUMP_VERSION:
+            raise ValueError('Unsupported model dump: {}'.format(path))
+
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def read_model_dump(path):
+    # type: (str) -> Iterator[Package]
+    for line in iter_model_dump_lines(path):
+        yield load_package(json.loads(line.decode('ascii')))
@@ -0,0 +1,104 @@
+"""Generation options.
+
+Headless runs cannot answer extra prompts,
+so options are read from `GHIDRA_PYI_*` environment variables.
+"""
+import os
+
+import attr
+from typing import Optional, Tuple
+
+from sharding import parse_shard
+from type_formatter import FULL, STUB_PROFILES
+
+
+def get_bool(environ, name, default=False):
+    # type: (dict, str, bool) -> bool
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_int(environ, name, default=None):
+    # type: (dict, str, Optional[int]) -> Optional[int]
+    value = environ.get(name)
+    if not value:
+        return default
+    return int(value)
+
+
+def get_choice(environ, name, choices):
+    # type: (dict, str, Tuple[str, ...]) -> str
+    """Read one of `choices`, the first one being the default."""
+    value = (environ.get(name) or choices[0]).strip().lower()
+    if value not in choices:
+        raise ValueError('{} must be one of {}, not {!r}'.format(name, ', '.join(choices), value))
+    return value
+
+
+def get_shard(environ, name):
+    # type: (dict, str) -> Optional[Tuple[int, int]]
+    value = environ.get(name)
+    if not value:
+        return None
+    return parse_shard(value.strip())
+
+
+@attr.s
+class Options(object):
+    # Extract only the `.json` members of the API docs zip, instead of reading the zip directly.
+    extract_docs = attr.ib(default=False)  # type: bool
+    # Number of class extraction threads. Defaults to the number of available processors.
+    workers = attr.ib(default=None)  # type: Optional[int]
+    # Format and write each package as soon as it is extracted, instead of building the whole model.
+    stream = attr.ib(default=False)  # type: bool
+    # Only extract the members classes declare, and leave inherited ones to their bases.
+    declared_only = attr.ib(default=False)  # type: bool
+    # Extract classes through `java.lang.reflect`, instead of through Jython's attributes.
+    java_reflection = attr.ib(default=False)  # type: bool
+    # Keep docstrings in the doc store until they are formatted,
+    # and share identical inherited overloads.
+    compact_model = attr.ib(default=False)  # type: bool
+    # Reuse the models of classes from unchanged jars, see `extraction_cache`.
+    extraction_cache = attr.ib(default=False)  # type: bool
+    # Only generate this `(index, count)` shard of the packages, for `merge_shards.py`.
+    shard = attr.ib(default=None)  # type: Optional[Tuple[int, int]]
+    # Retry loading classes that failed loading in previous runs.
+    recheck_classes = attr.ib(default=False)  # type: bool
+    # Write the stubs straight into a wheel of the stub package,
+    # instead of a `.pyi` tree and a `setup.py`.
+    wheel = attr.ib(default=False)  # type: bool
+    # How much of the docs goes into the stubs:
+    # `full`, `summary` (first sentences) or `signatures` (none).
+    stub_profile = attr.ib(default=FULL)  # type: str
+    # Dump the extracted model to this path for `format_model.py`, instead of formatting it.
+    dump_model = attr.ib(default=None)  # type: Optional[str]
+    # Record the reflection data of the extracted classes to this path,
+    # for `benchmarks/replay_fixture.py`.
+    record_reflection = attr.ib(default=None)  # type: Optional[str]
+    # Write a timing summary and a Chrome trace of the run to this directory.
+    profile = attr.ib(default=None)  # type: Optional[str]
+
+    @staticmethod
+    def from_environment(environ=None):
+        # type: (dict) -> Options
+        if environ is None:
+            environ = os.environ
+
+        return Options(
+            extract_docs=get_bool(environ, 'GHIDRA_PYI_EXTRACT_DOCS'),
+            workers=get_int(environ, 'GHIDRA_PYI_WORKERS'),
+            stream=get_bool(environ, 'GHIDRA_PYI_STREAM'),
+            declared_only=get_bool(environ, 'GHIDRA_PYI_DECLARED_ONLY'),
+            java_reflection=get_bool(environ, 'GHIDRA_PYI_JAVA_REFLECTION'),
+            compact_model=get_bool(environ, 'GHIDRA_PYI_COMPACT_MODEL'),
+            extraction_cache=get_bool(environ, 'GHIDRA_PYI_EXTRACTION_CACHE'),
+            shard=get_shard(environ, 'GHIDRA_PYI_SHARD'),
+            recheck_classes=get_bool(environ, 'GHIDRA_PYI_RECHECK_CLASSES'),
+            wheel=get_bool(environ, 'GHIDRA_PYI_WHEEL'),
+            stub_profile=get_choice(environ, 'GHIDRA_PYI_STUB_PROFILE', STUB_PROFILES),
+            dump_model=environ.get('GHIDRA_PYI_DUMP_MODEL') or None,
+            record_reflection=environ.get('GHIDRA_PYI_RECORD_REFLECTION') or None,
+            profile=environ.get('GHIDRA_PYI_PROFILE') or None,
+        )
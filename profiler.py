@@ -0,0 +1,190 @@
+"""Timing of a generation run, exported as a JSON summary and a Chrome trace.
+
+Spans are recorded through the module-level `span` function.
+Until `enable` is called it returns a shared no-op context manager,
+so instrumented code costs a function call when profiling is off.
+"""
+from __future__ import print_function
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from typing import Any, Dict, List, Optional
+
+try:
+    from java.lang import System
+
+    def get_time_us():
+        # type: () -> float
+        # `time.time` only has a millisecond resolution under Jython.
+        return System.nanoTime() / 1000.0
+except ImportError:
+    _clock = getattr(time, 'perf_counter', time.time)
+
+    def get_time_us():
+        # type: () -> float
+        return _clock() * 1000000.0
+
+SUMMARY_FILENAME = 'ghidra-pyi-profile.json'
+TRACE_FILENAME = 'ghidra-pyi-trace.json'
+
+# Span categories
+PHASE = 'phase'
+PACKAGE = 'package'
+CLASS = 'class'
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullProfiler(object):
+    """Records nothing."""
+    enabled = False
+
+    def span(self, name, category=PHASE, package=None):
+        # type: (str, str, Optional[str]) -> _NullSpan
+        return _NULL_SPAN
+
+
+class _Span(object):
+    __slots__ = ('profiler', 'name', 'category', 'package', 'start')
+
+    def __init__(self, profiler, name, category, package):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.package = package
+
+    def __enter__(self):
+        self.start = get_time_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.category, self.start, get_time_us(), self.package)
+        return False
+
+
+class Profiler(object):
+    """Records timed spans from any thread."""
+    enabled = True
+
+    def __init__(self):
+        self._events = []  # type: List[Dict[str, Any]]
+        self._lock = threading.Lock()
+        self._origin = get_time_us()
+
+    def span(self, name, category=PHASE, package=None):
+        # type: (str, str, Optional[str]) -> _Span
+        """Time a `with` block. `package` attributes class spans to their package."""
+        return _Span(self, name, category, package)
+
+    def record(self, name, category, start, end, package=None):
+        # type: (str, str, float, float, Optional[str]) -> None
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start - self._origin,
+            'dur': end - start,
+            'pid': 1,
+            'tid': threading.current_thread().ident,
+        }
+        if package is not None:
+            event['args'] = {'package': package}
+
+        with self._lock:
+            self._events.append(event)
+
+    def get_trace(self):
+        # type: () -> Dict[str, Any]
+        """The events in the Chrome trace-event format, for `chrome://tracing` or Perfetto."""
+        with self._lock:
+            events = list(self._events)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def get_summary(self, top=25):
+        # type: (int) -> Dict[str, Any]
+        """Total seconds per phase, and the `top` slowest classes and packages.
+
+        A package is charged with the extraction of its classes, wherever they ran,
+        and with its own formatting.
+        """
+        with self._lock:
+            events = list(self._events)
+
+        phases = defaultdict(float)  # type: Dict[str, float]
+        classes = []
+        packages = defaultdict(
+            lambda: {'extract': 0.0, 'format': 0.0}
+        )  # type: Dict[str, Dict[str, float]]
+        for event in events:
+            seconds = event['dur'] / 1000000.0
+            if event['cat'] == PHASE:
+                phases[event['name']] += seconds
+            elif event['cat'] == CLASS:
+                classes.append({'name': event['name'], 'seconds': seconds})
+                packages[event['args']['package']]['extract'] += seconds
+            elif event['cat'] == PACKAGE:
+                packages[event['name']]['format'] += seconds
+
+        package_totals = [
+            {'name': name, 'seconds': times['extract'] + times['format'],
+             'extract_seconds': times['extract'], 'format_seconds': times['format']}
+            for name, times in packages.items()
+        ]
+
+        def _slowest(items):
+            return sorted(items, key=lambda item: item['seconds'], reverse=True)[:top]
+
+        return {
+            'phases': dict(phases),
+            'class_count': len(classes),
+            'package_count': len(package_totals),
+            'slowest_classes': _slowest(classes),
+            'slowest_packages': _slowest(package_totals),
+        }
+
+    def save(self, directory, top=25):
+        # type: (str, int) -> None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        summary = self.get_summary(top)
+        with open(os.path.join(directory, SUMMARY_FILENAME), 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        with open(os.path.join(directory, TRACE_FILENAME), 'w') as f:
+            json.dump(self.get_trace(), f)
+
+        for name, seconds in sorted(summary['phases'].items(), key=lambda item: -item[1]):
+            print('{:>10.2f}s  {}'.format(seconds, name))
+        print('Profile written to {}'.format(directory))
+
+
+_profiler = NullProfiler()  # type: Any
+
+
+def enable():
+    # type: () -> Profiler
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def span(name, category=PHASE, package=None):
+    # type: (str, str, Optional[str]) -> Any
+    return _profiler.span(name, category, package)
@@ -2,6 +2,7 @@ from __future__ import print_function
 
 import os
 
+import attr
 import ghidra 
 
 try:
@@ -10,12 +11,24 @@ except ImportError:
     # 11.2 renamed everything to Jython
     import ghidra.jython.JythonScript as PythonScript
 
-import helper
 import type_extractor
 import type_formatter
 from type_extractor import OverloadSet
 from basic_type import BasicType
 from type_formatter import format_imports
+from requirements import get_requirements
+
+
+BUILTIN_CLASSES = (ghidra.program.flatapi.FlatProgramAPI, ghidra.app.script.GhidraScript)
+
+
+def get_class_name(cls):
+    # type: (type) -> str
+    return '{}.{}'.format(cls.__module__, cls.__name__)
+
+
+# The main extraction fills the cache with the builtins, or reuses them if they are extracted first.
+type_extractor.class_model_cache.keep(get_class_name(cls) for cls in BUILTIN_CLASSES)
 
 
 PYTHONSCRIPT_PROPERTIES = {
@@ -71,15 +84,15 @@ def is_instance_property(name):
 def get_type_signature(name, value):
     if name in PYTHONSCRIPT_PROPERTIES:
         t = BasicType.from_type(PYTHONSCRIPT_PROPERTIES[name])  # type: BasicType
-        return '{}: {}'.format(name, t.proper_name), t.requires
+        return '{}: {}'.format(name, t.proper_name), t.requires_mask
 
     if is_ghidra_value(value):
         t = BasicType.from_type(type(value))  # type: BasicType
-        return '{}: {}'.format(name, t.proper_name), t.requires
+        return '{}: {}'.format(name, t.proper_name), t.requires_mask
 
     if is_ghidra_method(value):
         overload_set = OverloadSet.from_reflected_function(value.im_func)
-        return '\n'.join(format_overload_set(overload_set)), overload_set.requires
+        return '\n'.join(format_overload_set(overload_set)), overload_set.requires_mask
 
     return None
 
@@ -88,25 +101,20 @@ def get_formatted_overload_set(overload_set):
     return '\n\n'.join(type_formatter.format_overload_set(overload_set, bound=True))
 
 
-def generate_ghidra_builtins(my_globals):
-    builtins = (ghidra.program.flatapi.FlatProgramAPI, ghidra.app.script.GhidraScript)
-    classes = [type_extractor.Class.from_class(cls) for cls in builtins]
-    imports = set().union(*(cls.requires for cls in classes))
+def generate_ghidra_builtins(my_globals, extraction=type_extractor.DEFAULT_EXTRACTION):
+    # Builtins are inherited by scripts, so they need the inherited methods as well.
+    extraction = attr.evolve(extraction, declared_only=False)
+    classes = [
+        type_extractor.extract_class(builtin, get_class_name(builtin), extraction)
+        for builtin in BUILTIN_CLASSES
+    ]
+    import_masks = [cls.requires_mask for cls in classes]
 
-    def _format_overloads():
-        for cls, builtin in zip(classes, builtins):
-            class_name = '{}.{}'.format(builtin.__module__, builtin.__name__)
-            try:
-                docs = helper.ClassDoc(class_name)
-            except KeyError:
-                docs = None
-            cls = type_extractor.Class.from_class(builtin, docs=docs)
-            imports.update(cls.requires)
-            for overload_set in cls.methods:
-                if overload_set.name in my_globals:
-                    yield (overload_set.name, get_formatted_overload_set(overload_set))
-
-    methods = dict(_format_overloads())
+    methods = {}
+    for cls in classes:
+        for overload_set in cls.methods:
+            if overload_set.name in my_globals:
+                methods[overload_set.name] = get_formatted_overload_set(overload_set)
 
     for name, value in my_globals.iteritems():
         if name in methods:
@@ -115,18 +123,22 @@ def generate_ghidra_builtins(my_globals):
         signature = get_type_signature(name, value)
         if signature:
             code, requires = signature
-            imports.update(requires)
+            import_masks.append(requires)
 
             methods[name] = code
 
+    imports = 0
+    for import_mask in import_masks:
+        imports |= import_mask
+
     return '\n'.join([
-        '\n'.join(format_imports(sorted(imports))),
+        '\n'.join(format_imports(sorted(get_requirements(imports)))),
         '\n\n',
         '\n\n'.join(sorted(methods.values())),
     ])
 
 
-def create_mock(pyi_root, my_globals):
-    builtins = generate_ghidra_builtins(my_globals)
+def create_mock(pyi_root, my_globals, extraction=type_extractor.DEFAULT_EXTRACTION):
+    builtins = generate_ghidra_builtins(my_globals, extraction)
     with open(os.path.join(pyi_root, 'ghidra_builtins.pyi'), 'w') as f:
         f.write(builtins)
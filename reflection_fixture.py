@@ -0,0 +1,516 @@
+"""Record the Jython reflection surface of a package, and replay it without Ghidra.
+
+A fixture is a gzip-compressed JSON-lines file: a header line, one line per package,
+and a last line with the docs of the classes the recorded ones inherit from.
+Each package line holds its classes, the names of its sub-packages, and the jsondoc of its classes.
+
+Every class records what `get_members` sees: each member's name, the module and name of its type,
+whether it is declared in the class `__dict__`, and what the extractor reads from it,
+including the declaring class of each method overload.
+Types are recorded as `[module, name]`.
+
+Replaying builds stand-in objects whose type names match the Jython ones
+(`reflectedfunction`, `beanproperty`, `reflectedfield`, `java.lang.Class`, `javapackage`...),
+so they go through the same extractor and formatter code.
+Under CPython 3, string and long constants are formatted without their `u` and `L` affixes.
+"""
+from __future__ import print_function
+
+import gzip
+import json
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import helper
+import type_extractor
+from type_extractor import get_members, get_package_members, is_nested_class
+from version import PYI_VERSION
+
+try:
+    long_type = long  # NOQA: F821
+    text_type = unicode  # NOQA: F821
+except NameError:
+    long_type = type_extractor.long
+    text_type = str
+
+FIXTURE_FORMAT = 'ghidra-pyi-reflection'
+FIXTURE_VERSION = 2
+
+REFLECTED_FUNCTION = 'reflectedfunction'
+REFLECTED_CONSTRUCTOR = 'reflectedconstructor'
+BEAN_PROPERTY = 'beanproperty'
+REFLECTED_FIELD = 'reflectedfield'
+CLASS = 'Class'
+
+
+def get_type_ref(t):
+    # type: (Optional[type]) -> Optional[List[str]]
+    if t is None:
+        return None
+    # The builtins module is `__builtin__` in Jython and `builtins` in CPython 3,
+    # so it is recorded as `None`, as in `model_dump`.
+    module = None if t.__module__ == str.__module__ else t.__module__
+    return [module, t.__name__]
+
+
+def get_type_key(type_ref):
+    # type: (List[Optional[str]]) -> Tuple[str, str]
+    module, name = type_ref
+    if module is None:
+        module = str.__module__
+    return str(module), str(name)
+
+
+def record_value(value):
+    # type: (Any) -> List[Any]
+    """Record a static final field value, as far as `pretty_repr` cares about it."""
+    for kind, value_type in (('bool', bool), ('long', long_type), ('int', int), ('float', float)):
+        if isinstance(value, value_type):
+            return [kind, value]
+    if isinstance(value, (str, text_type)):
+        return ['str', value]
+    return ['other', None]
+
+
+def record_args(reflected_args, is_constructor=False):
+    if reflected_args is None:
+        return None
+
+    method = reflected_args.method
+    if is_constructor:
+        return_type = declaring_class = None
+    else:
+        return_type = get_type_ref(method.getReturnType())
+        declaring_class = get_type_ref(method.getDeclaringClass())
+    return [
+        return_type,
+        [get_type_ref(t) for t in method.getParameterTypes()],
+        bool(reflected_args.isStatic),
+        declaring_class,
+    ]
+
+
+def record_field(cls, name, reflectedfield):
+    field_type = reflectedfield.field.getType()
+    modifiers = reflectedfield.field.getModifiers()
+
+    value = None
+    modifier = type_extractor.Modifier(modifiers)
+    if modifier.is_static and modifier.is_final:
+        try:
+            value = record_value(getattr(cls, name))
+        except type_extractor.java.lang.IllegalArgumentException:
+            value = ['raise', None]
+
+    return [get_type_ref(field_type), modifiers, value]
+
+
+def record_member(cls, name, obj):
+    typename = type(obj).__name__
+    if typename == REFLECTED_FUNCTION:
+        return {'name': obj.__name__, 'argslist': [record_args(args) for args in obj.argslist]}
+    if typename == REFLECTED_CONSTRUCTOR:
+        return {'argslist': [record_args(args, is_constructor=True) for args in obj.argslist]}
+    if typename == BEAN_PROPERTY:
+        return [
+            get_type_ref(obj.getMethod.getReturnType()) if obj.getMethod else None,
+            get_type_ref(obj.setMethod.getParameterTypes()[0]) if obj.setMethod else None,
+        ]
+    if typename == REFLECTED_FIELD:
+        return record_field(cls, name, obj)
+    if typename == CLASS:
+        if is_nested_class(cls, obj):
+            return {'nested': record_class(obj)}
+        return {'ref': get_type_ref(obj)}
+    return None
+
+
+def record_class(cls):
+    # type: (type) -> Dict[str, Any]
+    declared = cls.__dict__
+    members = []
+    for name, obj in sorted(get_members(cls).items()):
+        members.append(
+            [name, get_type_ref(type(obj)), name in declared, record_member(cls, name, obj)]
+        )
+
+    return {
+        'type': get_type_ref(cls),
+        'bases': [get_type_ref(base) for base in cls.__bases__],
+        'iterable': hasattr(cls, '__iter__'),
+        'members': members,
+    }
+
+
+def get_inherited_class_names(jsondoc):
+    # type: (dict) -> List[str]
+    names = list(jsondoc.get('implements') or ())
+    if jsondoc.get('extends'):
+        names.append(jsondoc['extends'])
+    return [helper.strip_type_arguments(name) for name in names]
+
+
+def record_package(package, path):
+    # type: (Any, str) -> None
+    """Record the reflection surface of a package and all of its sub-packages to `path`."""
+    recorded = set()  # type: Set[str]
+    inherited = set()  # type: Set[str]
+    package_count = 0
+
+    with gzip.open(path, 'wb') as f:
+        f.write(json.dumps(get_header()).encode('ascii') + b'\n')
+
+        stack = [package]
+        while stack:
+            current = stack.pop()
+            class_members, subpackages = get_package_members(current)
+            stack.extend(subpackages)
+
+            docs = {}
+            classes = []
+            for class_name, cls in class_members:
+                classes.append([class_name.rpartition('.')[-1], record_class(cls)])
+                recorded.add(class_name)
+
+                jsondoc = helper.get_jsondoc(class_name)
+                if jsondoc is not None:
+                    docs[class_name] = jsondoc
+                    inherited.update(get_inherited_class_names(jsondoc))
+
+            f.write(json.dumps({
+                'package': current.__name__,
+                'classes': classes,
+                'packages': [subpackage.__name__ for subpackage in subpackages],
+                'docs': docs,
+            }, sort_keys=True).encode('ascii') + b'\n')
+            package_count += 1
+
+        # Inherited docs are looked up while resolving overloads, so they are recorded as well.
+        inherited_docs = {}
+        pending = inherited - recorded
+        while pending:
+            class_name = pending.pop()
+            jsondoc = helper.get_jsondoc(class_name)
+            inherited_docs[class_name] = jsondoc
+            if jsondoc is not None:
+                pending.update(
+                    set(get_inherited_class_names(jsondoc)) - recorded - set(inherited_docs)
+                )
+        f.write(json.dumps({'docs': inherited_docs}, sort_keys=True).encode('ascii') + b'\n')
+
+    print('Recorded {} classes in {} packages to {}'.format(len(recorded), package_count, path))
+
+
+def get_header():
+    return {'format': FIXTURE_FORMAT, 'version': FIXTURE_VERSION, 'generator': PYI_VERSION}
+
+
+# Replay
+
+
+# Replay state of each replayed class: its bases, inherited members and member names.
+# It is kept out of the classes, so their `__dict__` only holds their declared members.
+_replay_state = {}  # type: Dict[type, Tuple[Tuple[type, ...], Dict[str, Any], List[str]]]
+
+
+class ReplayClass(type):
+    """The type of replayed Java classes. Like in Jython, it is `java.lang.Class`.
+
+    `dir` lists the recorded members, and inherited members are resolved
+    without being in `__dict__`. `__bases__` are the recorded bases.
+    """
+
+    def __dir__(cls):
+        return list(_replay_state[cls][2])
+
+    def __getattr__(cls, name):
+        try:
+            obj = _replay_state[cls][1][name]
+        except KeyError:
+            raise AttributeError(name)
+
+        if hasattr(type(obj), '__get__'):
+            return obj.__get__(None, cls)
+        return obj
+
+    @property
+    def __bases__(cls):
+        return _replay_state[cls][0]
+
+
+ReplayClass.__name__ = 'Class'
+ReplayClass.__module__ = 'java.lang'
+
+
+class IterableBase(object):
+    """Gives iterable classes an `__iter__` that is not in their own `__dict__`, as in Jython."""
+
+    def __iter__(self):
+        return iter(())
+
+
+class ReplayTypes(object):
+    """Stand-in types, shared by everything with the same recorded module and name."""
+
+    def __init__(self):
+        self._refs = {}  # type: Dict[Tuple[str, str], type]
+        self._member_types = {}  # type: Dict[Tuple[str, str], type]
+
+    def ref(self, type_ref):
+        # type: (Optional[List[str]]) -> Optional[type]
+        """A type that is only referenced, without members."""
+        if type_ref is None:
+            return None
+
+        key = get_type_key(type_ref)
+        t = self._refs.get(key)
+        if t is None:
+            t = self._refs[key] = self.new_class(key, (), {})
+        return t
+
+    @staticmethod
+    def new_class(key, bases, namespace, inherited=None, names=(), iterable=False):
+        module, name = key
+        namespace = dict(namespace)
+        namespace['__module__'] = module
+        cls = ReplayClass(name, (IterableBase,) if iterable else (object,), namespace)
+        _replay_state[cls] = (tuple(bases), inherited or {}, list(names))
+        return cls
+
+    def member_type(self, type_ref, base):
+        # type: (List[str], type) -> type
+        """A type named like the recorded one, e.g. `reflectedfunction`."""
+        key = get_type_key(type_ref)
+        t = self._member_types.get(key)
+        if t is None:
+            t = self._member_types[key] = type(key[1], (base,), {'__module__': key[0]})
+        return t
+
+
+class ReplayObject(object):
+    pass
+
+
+class ReplayMethod(object):
+    def __init__(self, return_type, parameter_types, declaring_class=None):
+        self._return_type = return_type
+        self._parameter_types = parameter_types
+        self._declaring_class = declaring_class
+
+    def getReturnType(self):
+        return self._return_type
+
+    def getParameterTypes(self):
+        return self._parameter_types
+
+    def getDeclaringClass(self):
+        return self._declaring_class
+
+
+class ReplayArgs(object):
+    def __init__(self, method, is_static):
+        self.method = method
+        self.isStatic = is_static
+
+
+class ReplayReflectedFunction(object):
+    def __init__(self, name, argslist):
+        self.__name__ = name
+        self.argslist = argslist
+
+
+class ReplayBeanProperty(object):
+    def __init__(self, get_method, set_method):
+        self.getMethod = get_method
+        self.setMethod = set_method
+
+
+class ReplayField(object):
+    def __init__(self, field_type, modifiers):
+        self._type = field_type
+        self._modifiers = modifiers
+
+    def getType(self):
+        return self._type
+
+    def getModifiers(self):
+        return self._modifiers
+
+
+class ReplayReflectedField(object):
+    """A descriptor, as in Jython: reading the field from its class gives its value."""
+
+    def __init__(self, field, value):
+        self.field = field
+        self._value = value
+
+    def __get__(self, instance, owner):
+        if self._value is None:
+            return self
+
+        kind, value = self._value
+        if kind == 'raise':
+            raise type_extractor.java.lang.IllegalArgumentException(self.field)
+        if kind == 'long':
+            return long_type(value)
+        if kind == 'str':
+            return text_type(value)
+        if kind == 'other':
+            return ReplayObject()
+        return value
+
+
+class ReplayPackage(object):
+    def __init__(self, name):
+        self.__name__ = name
+
+    def __dir__(self):
+        return list(self.__dict__)
+
+
+# Named like Jython's builtin type of Java packages.
+ReplayPackage.__name__ = 'javapackage'
+ReplayPackage.__module__ = str.__module__
+
+
+class Fixture(object):
+    """A fixture loaded in memory, with the root of its replayed package tree."""
+
+    def __init__(self, path):
+        # type: (str) -> None
+        self.types = ReplayTypes()
+        self.docs = {}  # type: Dict[str, Optional[dict]]
+        self.packages = {}  # type: Dict[str, ReplayPackage]
+        self.class_count = 0
+        self.root = None  # type: Optional[ReplayPackage]
+
+        subpackages = {}  # type: Dict[str, List[str]]
+        for record in read_fixture_records(path):
+            self.docs.update(record['docs'])
+            if 'package' not in record:
+                continue
+
+            package = self.packages[record['package']] = ReplayPackage(str(record['package']))
+            if self.root is None:
+                self.root = package
+            subpackages[record['package']] = record['packages']
+            for attr_name, class_record in record['classes']:
+                setattr(package, str(attr_name), self.replay_class(class_record))
+                self.class_count += 1
+
+        for name, subpackage_names in subpackages.items():
+            for subpackage_name in subpackage_names:
+                setattr(
+                    self.packages[name], str(subpackage_name.rpartition('.')[-1]),
+                    self.packages[subpackage_name],
+                )
+
+    def replay_args(self, args):
+        if args is None:
+            return None
+
+        return_type, parameter_types, is_static, declaring_class = args
+        method = ReplayMethod(
+            self.types.ref(return_type),
+            [self.types.ref(t) for t in parameter_types],
+            self.types.ref(declaring_class),
+        )
+        return ReplayArgs(method, is_static)
+
+    def replay_member(self, type_ref, payload):
+        typename = type_ref[1]
+        if typename == REFLECTED_FUNCTION:
+            member_type = self.types.member_type(type_ref, ReplayReflectedFunction)
+            return member_type(
+                str(payload['name']), [self.replay_args(args) for args in payload['argslist']]
+            )
+        if typename == REFLECTED_CONSTRUCTOR:
+            member_type = self.types.member_type(type_ref, ReplayReflectedFunction)
+            return member_type('__init__', [self.replay_args(args) for args in payload['argslist']])
+        if typename == BEAN_PROPERTY:
+            getter_type, setter_type = payload
+            member_type = self.types.member_type(type_ref, ReplayBeanProperty)
+            return member_type(
+                ReplayMethod(self.types.ref(getter_type), []) if getter_type else None,
+                ReplayMethod(None, [self.types.ref(setter_type)]) if setter_type else None,
+            )
+        if typename == REFLECTED_FIELD:
+            field_type, modifiers, value = payload
+            member_type = self.types.member_type(type_ref, ReplayReflectedField)
+            return member_type(ReplayField(self.types.ref(field_type), modifiers), value)
+        if typename == CLASS:
+            if 'nested' in payload:
+                return self.replay_class(payload['nested'])
+            return self.types.ref(payload['ref'])
+        return self.types.member_type(type_ref, ReplayObject)()
+
+    def replay_class(self, record):
+        # type: (Dict[str, Any]) -> type
+        declared = {}
+        inherited = {}
+        names = []
+        for name, type_ref, is_declared, payload in record['members']:
+            name = str(name)
+            names.append(name)
+            member = self.replay_member(type_ref, payload)
+            if is_declared:
+                declared[name] = member
+            else:
+                inherited[name] = member
+
+        return ReplayTypes.new_class(
+            get_type_key(record['type']),
+            [self.types.ref(base) for base in record['bases']],
+            declared,
+            inherited=inherited,
+            names=names,
+            iterable=record['iterable'],
+        )
+
+    def install_docs(self):
+        """Serve the recorded docs to the extractor."""
+        helper.set_jsondoc_source(FixtureJsonDocSource(self.docs))
+
+
+class FixtureJsonDocSource(object):
+    """A jsondoc source over the docs recorded in a fixture."""
+
+    def __init__(self, docs):
+        # type: (Dict[str, Optional[dict]]) -> None
+        self.docs = docs
+
+    @property
+    def class_names(self):
+        return [name for name, jsondoc in self.docs.items() if jsondoc is not None]
+
+    def read(self, class_name):
+        jsondoc = self.docs.get(class_name)
+        if jsondoc is None:
+            return None
+        return json.dumps(jsondoc).encode('ascii')
+
+    def get(self, class_name):
+        return self.docs.get(class_name)
+
+    def close(self):
+        pass
+
+
+def read_fixture_records(path):
+    # type: (str) -> Iterable[Dict[str, Any]]
+    with gzip.open(path, 'rb') as f:
+        header = json.loads(f.readline().decode('ascii'))
+        if header.get('format') != FIXTURE_FORMAT or header.get('version') != FIXTURE_VERSION:
+            raise ValueError('Unsupported reflection fixture: {}'.format(path))
+
+        for line in f:
+            if line.strip():
+                yield json.loads(line.decode('ascii'))
+
+
+def load_fixture(path):
+    # type: (str) -> Fixture
+    """Load a fixture, and serve its docs to the extractor."""
+    fixture = Fixture(path)
+    fixture.install_docs()
+    return fixture
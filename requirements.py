@@ -0,0 +1,44 @@
+"""Import requirements of the model, as bitsets over a process-wide table.
+
+A requirement is a module to import, or a `(module, member)` pair to import from.
+Every distinct requirement gets a bit the first time it is seen,
+so the requirements of a model object fit in a single int, and merging them is a bitwise or.
+"""
+import threading
+
+from typing import Iterable, List, Tuple, Union
+
+Requirement = Union[str, Tuple[str, str]]
+
+_bits = {}  # type: dict
+_requirements = []  # type: List[Requirement]
+_lock = threading.Lock()
+
+
+def get_mask(requirements):
+    # type: (Iterable[Requirement]) -> int
+    mask = 0
+    for requirement in requirements:
+        bit = _bits.get(requirement)
+        if bit is None:
+            with _lock:
+                bit = _bits.get(requirement)
+                if bit is None:
+                    _requirements.append(requirement)
+                    bit = _bits[requirement] = 1 << (len(_requirements) - 1)
+        mask |= bit
+    return mask
+
+
+def get_requirements(mask):
+    # type: (int) -> List[Requirement]
+    requirements = []
+    while mask:
+        lowest_bit = mask & -mask
+        requirements.append(_requirements[lowest_bit.bit_length() - 1])
+        mask ^= lowest_bit
+    return requirements
+
+
+TYPING_ITERATOR = get_mask([('typing', 'Iterator')])
+TYPING_OVERLOAD = get_mask([('typing', 'overload')])
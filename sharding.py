@@ -0,0 +1,86 @@
+"""Split the generation into shards of packages, balanced by their number of classes.
+
+Every shard runs the whole generator on its own (in its own Ghidra process),
+but only loads and extracts the classes of its packages.
+`merge_shards.py` then combines the output trees of all shards.
+
+The plan only depends on the list of class names and the number of shards,
+so every shard computes the same plan on its own.
+"""
+import heapq
+import zlib
+from collections import Counter
+
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+def parse_shard(text):
+    # type: (str) -> Tuple[int, int]
+    """Parse a `<index>/<count>` shard specification, with a 0-based index."""
+    index, _sep, count = text.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(
+            'Invalid shard {!r}, expected <index>/<count> with 0 <= index < count'.format(text)
+        )
+    return index, count
+
+
+def get_package_name(class_name):
+    # type: (str) -> str
+    """The package of a class is everything before the first capitalized name.
+
+    Nested classes follow the name of their outer class.
+    """
+    parts = class_name.split('.')
+    for index, part in enumerate(parts):
+        if part[:1].isupper():
+            return '.'.join(parts[:index])
+    return class_name.rpartition('.')[0]
+
+
+class ShardPlan(object):
+    """Assigns every package to one of `count` shards.
+
+    Packages are assigned largest first, each to the least loaded shard.
+    Packages the plan does not know about are spread over the shards
+    by a stable hash of their names.
+    """
+
+    def __init__(self, count, assignments):
+        # type: (int, Dict[str, int]) -> None
+        self.count = count
+        self.assignments = assignments
+
+    @staticmethod
+    def from_class_names(class_names, count):
+        # type: (Iterable[str], int) -> ShardPlan
+        sizes = Counter(get_package_name(class_name) for class_name in set(class_names))
+
+        loads = [(0, index) for index in range(count)]
+        assignments = {}
+        for package_name, size in sorted(sizes.items(), key=lambda item: (-item[1], item[0])):
+            load, index = heapq.heappop(loads)
+            assignments[package_name] = index
+            heapq.heappush(loads, (load + size, index))
+
+        return ShardPlan(count, assignments)
+
+    def get_shard(self, package_name):
+        # type: (str) -> int
+        index = self.assignments.get(package_name)
+        if index is None:
+            index = (zlib.crc32(package_name.encode('utf8')) & 0xffffffff) % self.count
+        return index
+
+    def get_package_filter(self, index):
+        # type: (int) -> Callable[[str], bool]
+        return lambda package_name: self.get_shard(package_name) == index
+
+    def get_class_filter(self, index):
+        # type: (int) -> Callable[[str], bool]
+        return lambda class_name: self.get_shard(get_package_name(class_name)) == index
+
+    def get_packages(self, index):
+        # type: (int) -> List[str]
+        return sorted(name for name, shard in self.assignments.items() if shard == index)
@@ -0,0 +1,123 @@
+"""The output stage: writes generated files on a bounded pool of threads."""
+from __future__ import print_function
+
+import errno
+import io
+import os
+import sys
+import threading
+from collections import defaultdict
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+if sys.version_info[0] >= 3:
+    def reraise(exc_info):
+        raise exc_info[1].with_traceback(exc_info[2])
+else:
+    # The three-argument raise is a syntax error under Python 3.
+    exec('def reraise(exc_info):\n    raise exc_info[0], exc_info[1], exc_info[2]\n')
+
+
+class ImportIndex(object):
+    """The imports of every `__init__.pyi`, collected in memory and written once."""
+
+    def __init__(self):
+        self._imports = defaultdict(set)  # type: Dict[str, Set[str]]
+
+    def add(self, package_path, imports):
+        # type: (str, Iterable[str]) -> None
+        self._imports[package_path].update(imports)
+
+    def items(self):
+        # type: () -> List[Tuple[str, Set[str]]]
+        return sorted(self._imports.items())
+
+    @staticmethod
+    def format(imports):
+        # type: (Iterable[str]) -> str
+        return '\n'.join(sorted(imports))
+
+
+def write_file(path, content):
+    # type: (str, Any) -> None
+    if isinstance(content, bytes):
+        content = content.decode('utf8')
+
+    with io.open(path, 'w', encoding='utf8') as f:
+        f.write(content)
+
+
+class StubWriter(object):
+    """Writes files under `root` on a pool of threads, fed through a bounded queue.
+
+    Formatting can go on while earlier files are being written.
+    Errors raised by the writer threads are re-raised by `close`, with their traceback,
+    unless the writer is left by another exception.
+    """
+
+    def __init__(self, root, workers=4, queue_size=256):
+        # type: (str, int, int) -> None
+        self.root = root
+        self._queue = Queue(queue_size)
+        self._directories = set()  # type: Set[str]
+        self._error = None  # type: Optional[Tuple]
+        self._threads = [threading.Thread(target=self._run) for _ in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            path, content = item
+            try:
+                write_file(path, content)
+            except Exception:
+                if self._error is None:
+                    self._error = sys.exc_info()
+
+    def _ensure_directory(self, directory):
+        if directory in self._directories:
+            return
+
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self._directories.add(directory)
+
+    def write(self, relative_path, content):
+        # type: (str, Any) -> None
+        path = os.path.join(self.root, relative_path)
+        self._ensure_directory(os.path.dirname(path))
+        self._queue.put((path, content))
+
+    def _join(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def close(self):
+        self._join()
+        if self._error is not None:
+            reraise(self._error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            # Do not hide the exception that is already propagating.
+            self._join()
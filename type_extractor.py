@@ -1,12 +1,38 @@
 import keyword
-from collections import defaultdict
-from typing import List, Dict, Any, Optional, DefaultDict
+import sys
+import threading
+from collections import defaultdict, deque
+from typing import (
+    List, Dict, Any, Optional, DefaultDict, Callable, Iterable, Iterator, Tuple, Union,
+)
 
 import attr
-import java.lang.reflect.Modifier
 
+try:
+    import java.lang
+    import java.lang.reflect.Modifier
+    import java.util.concurrent
+    JavaCallable = java.util.concurrent.Callable
+except ImportError:
+    # Outside of Jython only the model itself is usable, e.g. by `format_model.py`.
+    java = None
+    JavaCallable = object
+
+import profiler
 from basic_type import BasicType
-from helper import ClassDoc, OverloadSetDoc, MethodDoc
+from helper import (
+    ClassDoc, DocRef, OverloadSetDoc, MethodDoc, get_class_doc, class_doc_cache, get_docstring_key,
+)
+from manifest import get_fingerprint
+from requirements import TYPING_ITERATOR, TYPING_OVERLOAD, get_requirements
+
+if sys.version_info[0] >= 3:
+    # Recorded reflection data can be replayed under CPython 3, see `reflection_fixture`.
+    # Java longs are replayed as this subclass, so they are still formatted in hex.
+    class long(int):
+        pass
+
+    unicode = str
 
 
 def is_nested_class(parent, child):
@@ -24,8 +50,12 @@ def is_nested_class(parent, child):
     return True
 
 
-def get_members(obj):
-    # type: (Any) -> Dict[str,Any]
+def get_members(obj, declared_only=False):
+    # type: (Any, bool) -> Dict[str,Any]
+    if declared_only:
+        # Inherited members are left to the bases.
+        return dict(obj.__dict__)
+
     members = {}
     for name in dir(obj):
         try:
@@ -49,18 +79,72 @@ def get_members(obj):
     return members
 
 
+def are_bases_generated(cls):
+    # type: (type) -> bool
+    """Check if all the bases of a class are in its top-level package.
+
+    If so, they get stubs of their own.
+    """
+    root = cls.__module__.partition('.')[0]
+    return all(base.__module__.partition('.')[0] == root for base in cls.__bases__)
+
+
+def is_declared_by(cls, method):
+    # type: (type, Any) -> bool
+    return BasicType.from_type(method.getDeclaringClass()) == BasicType.from_type(cls)
+
+
+def declares_overload(cls, reflected_function):
+    # type: (type, Any) -> bool
+    """Check if a class declares an overload of a method, instead of only inheriting all of them."""
+    return any(
+        is_declared_by(cls, reflected_args.method)
+        for reflected_args in reflected_function.argslist
+        if reflected_args is not None
+    )
+
+
+# Flyweight table of names. Member and argument names recur all over the model.
+# Keyed by type as well, as byte and unicode names compare equal under Jython.
+_interned_names = {}  # type: Dict[Tuple[type, str], str]
+
+
+def intern_name(name):
+    # type: (str) -> str
+    return _interned_names.setdefault((type(name), name), name)
+
+
+def intern_names(names):
+    # type: (Iterable[str]) -> Tuple[str, ...]
+    return tuple(intern_name(name) for name in names)
+
+
+def add_fingerprint_parts(parts, members):
+    # type: (List[Any], Tuple[Any, ...]) -> None
+    """Add the fingerprint parts of a sequence of members, after their number."""
+    parts.append(str(len(members)))
+    for member in members:
+        member.add_fingerprint_parts(parts)
+
+
+def get_type_name(basic_type):
+    # type: (Optional[BasicType]) -> str
+    """The name of a type in the stubs, which is all a fingerprint cares about."""
+    if basic_type is None:
+        return ''
+    return basic_type.proper_name
+
+
 def make_valid_name(name):
     if keyword.iskeyword(name):
         return '{}_'.format(name)
     return name
 
 
-def get_argument_names(argument_types, docs):
-    # type: (List[BasicType], Optional[OverloadSetDoc]) -> List[str]
-    if docs:
-        overload_doc = docs.get_overload(argument_types)
-        if overload_doc:
-            return [make_valid_name(param.name) for param in overload_doc.params]
+def get_argument_names(argument_types, overload_doc):
+    # type: (List[BasicType], Optional[MethodDoc]) -> List[str]
+    if overload_doc:
+        return [make_valid_name(param.name) for param in overload_doc.params]
 
     return ['__a{}'.format(i) for i in range(len(argument_types))]
 
@@ -75,84 +159,231 @@ def get_return_type(return_type, docs):
 
 
 @attr.s
+class ReflectedArgs(object):
+    """What is read from Jython's `ReflectedArgs`, for methods found through `java.lang.reflect`."""
+    method = attr.ib()
+    isStatic = attr.ib()  # type: bool  # NOQA: N815
+
+
+@attr.s
+class BeanProperty(object):
+    """What is read from Jython's `beanproperty`, for accessors found through reflection."""
+    getMethod = attr.ib()  # NOQA: N815
+    setMethod = attr.ib()  # NOQA: N815
+
+
+def is_public(member):
+    return java.lang.reflect.Modifier.isPublic(member.getModifiers())
+
+
+def is_static(member):
+    return java.lang.reflect.Modifier.isStatic(member.getModifiers())
+
+
+def decapitalize(name):
+    # type: (str) -> str
+    """Name a bean property like `java.beans.Introspector`, as Jython does."""
+    if len(name) > 1 and name[0].isupper() and name[1].isupper():
+        return name
+    return name[:1].lower() + name[1:]
+
+
+def get_java_methods(cls):
+    # type: (type) -> Dict[str, List[Any]]
+    """The public methods of a class, including inherited ones, by name.
+
+    Bridge methods are left out, and so are inherited methods with an already-seen signature.
+    Overloads are ordered by their parameters.
+    """
+    methods = defaultdict(list)  # type: DefaultDict[str, List[Any]]
+    signatures = set()
+    for method in java.lang.Class.getMethods(cls):
+        if method.isBridge() or method.isSynthetic():
+            continue
+
+        signature = (method.getName(), tuple(t.getName() for t in method.getParameterTypes()))
+        if signature in signatures:
+            continue
+        signatures.add(signature)
+        methods[method.getName()].append(method)
+
+    for overloads in methods.values():
+        overloads.sort(key=lambda method: [t.getName() for t in method.getParameterTypes()])
+    return methods
+
+
+def get_bean_properties(methods, reserved_names):
+    # type: (Dict[str, List[Any]], Iterable[str]) -> Dict[str, BeanProperty]
+    """Bean properties from `getX`, `isX` and `setX` accessors.
+
+    Accessors named like other members do not make properties.
+    """
+    getters = {}
+    setters = {}
+    for name, overloads in methods.items():
+        for method in overloads:
+            if is_static(method):
+                continue
+
+            parameter_count = len(method.getParameterTypes())
+            if parameter_count == 0:
+                return_type = BasicType.from_type(method.getReturnType()).proper_name
+                if name.startswith('get') and len(name) > 3 and return_type != 'None':
+                    getters.setdefault(decapitalize(name[3:]), method)
+                elif name.startswith('is') and len(name) > 2 and return_type == 'bool':
+                    getters.setdefault(decapitalize(name[2:]), method)
+            elif parameter_count == 1 and name.startswith('set') and len(name) > 3:
+                setters.setdefault(decapitalize(name[3:]), method)
+
+    reserved_names = set(reserved_names)
+    return dict(
+        (name, BeanProperty(getMethod=getters.get(name), setMethod=setters.get(name)))
+        for name in set(getters) | set(setters)
+        if name not in reserved_names
+    )
+
+
+@attr.s(slots=True)
 class Overload(object):
     return_type = attr.ib()  # type: BasicType
-    argument_types = attr.ib()  # type: List[BasicType]
-    argument_names = attr.ib()  # type: List[str]
+    argument_types = attr.ib(converter=tuple)  # type: Tuple[BasicType, ...]
+    argument_names = attr.ib(converter=intern_names)  # type: Tuple[str, ...]
     is_static = attr.ib()  # type: bool
-    docstring = attr.ib()  # type: Optional[str]
+    # A `DocRef` in compact models, see `helper.resolve_docstring`.
+    docstring = attr.ib()  # type: Union[str, DocRef, None]
+    _requires_mask = attr.ib(default=None, init=False, repr=False, eq=False)  # type: Optional[int]
 
     @staticmethod
-    def from_reflected_args(reflected_args, ctor_for=None, docs=None):
-        # type: (Any, Any, Optional[OverloadSetDoc]) -> Overload
+    def from_reflected_args(reflected_args, ctor_for=None, docs=None, compact_for=None):
+        # type: (Any, Any, Optional[OverloadSetDoc], Any) -> Overload
+        """Extract an overload.
+
+        With `compact_for`, the class being extracted, the docstring is left in the doc store,
+        and overloads the class inherits are shared with the other classes that inherit them.
+        """
         if ctor_for is not None:
             return_type = ctor_for
         else:
             return_type = reflected_args.method.getReturnType()
 
         return_type = BasicType.from_type(return_type)
-        argument_types = map(BasicType.from_type, reflected_args.method.getParameterTypes())
+        argument_types = [BasicType.from_type(t) for t in reflected_args.method.getParameterTypes()]
 
-        argument_names = get_argument_names(argument_types, docs)
+        overload_docs = docs.get_overload(argument_types) if docs else None
+        argument_names = get_argument_names(argument_types, overload_docs)
 
         docstring = ''
-        if docs:
-            overload_docs = docs.get_overload(argument_types)
-            if overload_docs:
-                docstring = overload_docs.javadoc
-                argument_types = [param.type for param in overload_docs.params]
-                return_type = get_return_type(return_type, overload_docs)
+        if overload_docs:
+            docstring = overload_docs.ref if compact_for is not None else overload_docs.javadoc
+            argument_types = overload_docs.param_types
+            return_type = get_return_type(return_type, overload_docs)
 
-        return Overload(
+        overload = Overload(
             return_type=return_type,
             argument_types=argument_types,
             argument_names=argument_names,
             is_static=reflected_args.isStatic,
             docstring=docstring
         )
+        if (
+            compact_for is not None
+            and ctor_for is None
+            and not is_declared_by(compact_for, reflected_args.method)
+        ):
+            overload = shared_overloads.share(overload)
+        return overload
+
+    @property
+    def key(self):
+        # type: () -> Tuple
+        return (
+            self.return_type, self.argument_types, self.argument_names, self.is_static,
+            self.docstring,
+        )
+
+    def add_fingerprint_parts(self, parts):
+        # type: (List[Any]) -> None
+        parts.append(self.return_type.proper_name)
+        parts.append(str(len(self.argument_types)))
+        parts.extend([argument_type.proper_name for argument_type in self.argument_types])
+        parts.extend(self.argument_names)
+        parts.append('static' if self.is_static else '')
+        parts.extend(get_docstring_key(self.docstring))
+
+    @property
+    def requires_mask(self):
+        # type: () -> int
+        if self._requires_mask is None:
+            mask = self.return_type.requires_mask
+            for argument_type in self.argument_types:
+                mask |= argument_type.requires_mask
+            self._requires_mask = mask
+        return self._requires_mask
 
     @property
     def requires(self):
-        return self.return_type.requires.union(*(t.requires for t in self.argument_types))
+        return set(get_requirements(self.requires_mask))
 
 
-@attr.s
+@attr.s(slots=True)
 class OverloadSet(object):
-    name = attr.ib()
-    overloads = attr.ib()  # type: List[Overload]
+    name = attr.ib(converter=intern_name)  # type: str
+    overloads = attr.ib(converter=tuple)  # type: Tuple[Overload, ...]
     is_constructor = attr.ib(default=False)  # type: bool
+    _requires_mask = attr.ib(default=None, init=False, repr=False, eq=False)  # type: Optional[int]
 
     @staticmethod
-    def from_reflected_function(reflected_function, docs=None):
-        # type: (Any, Optional[OverloadSetDoc])->OverloadSet
+    def from_reflected_function(reflected_function, docs=None, compact_for=None):
+        # type: (Any, Optional[OverloadSetDoc], Any) -> OverloadSet
         def _get_overloads():
             for reflected_args in reflected_function.argslist:
                 if reflected_args is not None:
-                    yield Overload.from_reflected_args(reflected_args, docs=docs)
+                    yield Overload.from_reflected_args(
+                        reflected_args, docs=docs, compact_for=compact_for,
+                    )
 
-        return OverloadSet(name=reflected_function.__name__, overloads=list(_get_overloads()))
+        overload_set = OverloadSet(name=reflected_function.__name__, overloads=_get_overloads())
+        if compact_for is not None and not declares_overload(compact_for, reflected_function):
+            overload_set = shared_overloads.share_set(overload_set)
+        return overload_set
 
     @staticmethod
-    def from_reflected_constructor(reflected_constructor, cls, docs=None):
+    def from_reflected_constructor(reflected_constructor, cls, docs=None, compact_for=None):
         def _get_overloads():
             for reflected_args in reflected_constructor.argslist:
                 if reflected_args is not None:
-                    yield Overload.from_reflected_args(reflected_args, ctor_for=cls, docs=docs)
+                    yield Overload.from_reflected_args(
+                        reflected_args, ctor_for=cls, docs=docs, compact_for=compact_for,
+                    )
 
-        return OverloadSet(name='__init__', overloads=list(_get_overloads()), is_constructor=True)
+        return OverloadSet(name='__init__', overloads=_get_overloads(), is_constructor=True)
+
+    @property
+    def requires_mask(self):
+        # type: () -> int
+        if self._requires_mask is None:
+            mask = 0
+            for overload in self.overloads:
+                mask |= overload.requires_mask
+            if len(self.overloads) > 1:
+                mask |= TYPING_OVERLOAD
+            self._requires_mask = mask
+        return self._requires_mask
 
     @property
     def requires(self):
-        requirements = set().union(*(overload.requires for overload in self.overloads))
-        if len(self.overloads) > 1:
-            requirements.add(('typing', 'overload'))
+        return set(get_requirements(self.requires_mask))
 
-        return requirements
+    def add_fingerprint_parts(self, parts):
+        # type: (List[Any]) -> None
+        parts.append(self.name)
+        parts.append('constructor' if self.is_constructor else '')
+        add_fingerprint_parts(parts, self.overloads)
 
 
-@attr.s
+@attr.s(slots=True)
 class Property(object):
-    name = attr.ib()
+    name = attr.ib(converter=intern_name)  # type: str
     getter_type = attr.ib()  # type: BasicType
     setter_type = attr.ib()  # type: BasicType
 
@@ -180,8 +411,14 @@ class Property(object):
 
         return Property(name=name, setter_type=setter_type, getter_type=getter_type)
 
+    def add_fingerprint_parts(self, parts):
+        # type: (List[Any]) -> None
+        parts.append(self.name)
+        parts.append(get_type_name(self.getter_type))
+        parts.append(get_type_name(self.setter_type))
 
-@attr.s
+
+@attr.s(slots=True)
 class Modifier(object):
     modifiers = attr.ib()  # type: int
 
@@ -214,9 +451,9 @@ def pretty_repr(value):
     return ''
 
 
-@attr.s
+@attr.s(slots=True)
 class Field(object):
-    name = attr.ib()  # type: str
+    name = attr.ib(converter=intern_name)  # type: str
     my_type = attr.ib()  # type: BasicType
     modifiers = attr.ib()  # type: Modifier
     value_repr = attr.ib()  # type: Optional[str]
@@ -247,8 +484,42 @@ class Field(object):
             has_value=has_value,
         )
 
+    @staticmethod
+    def from_java_field(field):
+        # type: (Any) -> Field
+        """Extract a `java.lang.reflect.Field`, reading constant values from the field itself."""
+        modifiers = Modifier(field.getModifiers())
 
-@attr.s
+        value_repr = None
+        has_value = False
+
+        if modifiers.is_static and modifiers.is_final:
+            try:
+                value_repr = pretty_repr(field.get(None))
+                has_value = value_repr != ''
+            except java.lang.Throwable:
+                # Reading the field runs the static initializer of its class,
+                # which can fail with an `Error` as well as an `Exception`.
+                pass
+
+        return Field(
+            name=field.getName(),
+            my_type=BasicType.from_type(field.getType()),
+            modifiers=modifiers,
+            value_repr=value_repr,
+            has_value=has_value,
+        )
+
+    def add_fingerprint_parts(self, parts):
+        # type: (List[Any]) -> None
+        parts.append(self.name)
+        parts.append(get_type_name(self.my_type))
+        parts.append(str(self.modifiers.modifiers))
+        parts.append(self.value_repr if self.has_value else '')
+        parts.append('value' if self.has_value else '')
+
+
+@attr.s(slots=True)
 class NamedObject(object):
     name = attr.ib()
     obj = attr.ib()
@@ -258,31 +529,44 @@ def group_by_typename(items):
     # type: (Dict[str,Any]) -> Dict[str, List[NamedObject]]
     groups = defaultdict(list)  # type: DefaultDict[str, List[NamedObject]]
 
-    for name, obj in items.iteritems():
+    for name, obj in items.items():
         type_name = type(obj).__name__
         groups[type_name].append(NamedObject(name=name, obj=obj))
 
     return groups
 
 
-@attr.s
+@attr.s(slots=True)
 class Class(object):
-    name = attr.ib()
-    methods = attr.ib()  # type: List[OverloadSet]
-    constructors = attr.ib()  # type: List[OverloadSet]
-    properties = attr.ib()  # type: List[Property]
-    fields = attr.ib()  # type: List[Field]
-    nested_classes = attr.ib()  # type: List[Class]
+    name = attr.ib(converter=intern_name)  # type: str
+    methods = attr.ib(converter=tuple)  # type: Tuple[OverloadSet, ...]
+    constructors = attr.ib(converter=tuple)  # type: Tuple[OverloadSet, ...]
+    properties = attr.ib(converter=tuple)  # type: Tuple[Property, ...]
+    fields = attr.ib(converter=tuple)  # type: Tuple[Field, ...]
+    nested_classes = attr.ib(converter=tuple)  # type: Tuple[Class, ...]
     is_iterable = attr.ib()  # type: bool
-    bases = attr.ib()  # type: List[BasicType]
-    docstring = attr.ib(default=None)  # type: Optional[str]
+    bases = attr.ib(converter=tuple)  # type: Tuple[BasicType, ...]
+    # A `DocRef` in compact models, see `helper.resolve_docstring`.
+    docstring = attr.ib(default=None)  # type: Union[str, DocRef, None]
+    _requires_mask = attr.ib(default=None, init=False, repr=False, eq=False)  # type: Optional[int]
+    _fingerprint = attr.ib(default=None, init=False, repr=False, eq=False)  # type: Optional[str]
 
     @staticmethod
-    def from_class(cls, docs=None):
-        # type: (type, Optional[ClassDoc]) -> Class
+    def from_class(cls, docs=None, declared_only=False, compact=False):
+        # type: (type, Optional[ClassDoc], bool, bool) -> Class
+        """Extract a class.
+
+        With `declared_only`, only the members the class declares are extracted,
+        and methods whose overloads are all inherited are left out, as its stub inherits them.
+        Classes with bases that get no stubs of their own are always fully extracted.
+        With `compact`, the model is compact, see `Overload.from_reflected_args`.
+        """
         # TODO: Handle the following typenames:
         #       beanevent, beaneventproperty, method_descriptor
-        member_groups = group_by_typename(get_members(cls))  # type: Dict[str, List[NamedObject]]
+        declared_only = declared_only and are_bases_generated(cls)
+        member_groups = group_by_typename(
+            get_members(cls, declared_only)
+        )  # type: Dict[str, List[NamedObject]]
 
         # Nested classes have funky names and we need to handle them.
         name = cls.__name__.rpartition('$')[-1]
@@ -292,15 +576,19 @@ class Class(object):
         # type information on it.
         is_iterable = hasattr(cls, '__iter__')
 
+        compact_for = cls if compact else None
         docstring = None
         if docs:
-            docstring = docs.comment
+            docstring = DocRef(docs.class_name) if compact else docs.comment
 
         methods = []
         for nobj in member_groups['reflectedfunction']:
+            if declared_only and not declares_overload(cls, nobj.obj):
+                continue
+
             method_docs = docs.get_overload_set(nobj.name) if docs else None
             method = OverloadSet.from_reflected_function(
-                reflected_function=nobj.obj, docs=method_docs,
+                reflected_function=nobj.obj, docs=method_docs, compact_for=compact_for,
             )
             methods.append(method)
 
@@ -308,7 +596,7 @@ class Class(object):
         for nobj in member_groups['reflectedconstructor']:
             ctor_docs = docs.get_overload_set('<init>') if docs else None
             ctor = OverloadSet.from_reflected_constructor(
-                reflected_constructor=nobj.obj, cls=cls, docs=ctor_docs,
+                reflected_constructor=nobj.obj, cls=cls, docs=ctor_docs, compact_for=compact_for,
             )
             constructors.append(ctor)
 
@@ -328,27 +616,339 @@ class Class(object):
             # so we cannot grab it without adding HTML parsing.
             # TODO: Use HTML parsing to populate nested class documentation.
             nested_classes=[
-                Class.from_class(nobj.obj)
+                Class.from_class(nobj.obj, declared_only=declared_only, compact=compact)
                 for nobj in member_groups['Class']
                 if is_nested_class(cls, nobj.obj)
             ],
             is_iterable=is_iterable,
-            bases=map(BasicType.from_type, cls.__bases__),
+            bases=[BasicType.from_type(base) for base in cls.__bases__],
             docstring=docstring
         )
 
+    @staticmethod
+    def from_java_class(cls, docs=None, declared_only=False, compact=False):
+        # type: (type, Optional[ClassDoc], bool, bool) -> Class
+        """Extract a class through `java.lang.reflect`, instead of through Jython's attributes.
+
+        Members are read with one call per kind of member,
+        so neither attribute resolution nor its errors happen one member at a time.
+        Overloads are ordered by their parameters, instead of in Jython's dispatch order.
+        Classes whose members reference classes that cannot be loaded fall back to `from_class`.
+        """
+        declared_only = declared_only and are_bases_generated(cls)
+        try:
+            java_methods = get_java_methods(cls)
+            java_constructors = [ctor for ctor in java.lang.Class.getConstructors(cls)]
+            if declared_only:
+                java_fields = [
+                    field for field in java.lang.Class.getDeclaredFields(cls) if is_public(field)
+                ]
+            else:
+                java_fields = list(java.lang.Class.getFields(cls))
+            nested_classes = [
+                nested_class for nested_class in java.lang.Class.getDeclaredClasses(cls)
+                if is_public(nested_class) and is_nested_class(cls, nested_class)
+            ]
+        except java.lang.NoClassDefFoundError:
+            return Class.from_class(cls, docs=docs, declared_only=declared_only, compact=compact)
+
+        compact_for = cls if compact else None
+        declaring_type = BasicType.from_type(cls)
+
+        def _is_declared(method):
+            return BasicType.from_type(method.getDeclaringClass()) == declaring_type
+
+        bean_properties = get_bean_properties(
+            java_methods, list(java_methods) + [field.getName() for field in java_fields],
+        )
+        if declared_only:
+            java_methods = dict(
+                (name, overloads) for name, overloads in java_methods.items()
+                if any(_is_declared(method) for method in overloads)
+            )
+            bean_properties = dict(
+                (name, bean_property) for name, bean_property in bean_properties.items()
+                if any(
+                    _is_declared(method)
+                    for method in (bean_property.getMethod, bean_property.setMethod) if method
+                )
+            )
+
+        methods = []
+        for name in sorted(java_methods):
+            method_docs = docs.get_overload_set(name) if docs else None
+            method = OverloadSet(name=name, overloads=[
+                Overload.from_reflected_args(
+                    ReflectedArgs(method, is_static(method)),
+                    docs=method_docs, compact_for=compact_for,
+                )
+                for method in java_methods[name]
+            ])
+            if compact_for is not None and not any(
+                _is_declared(overload) for overload in java_methods[name]
+            ):
+                method = shared_overloads.share_set(method)
+            methods.append(method)
+
+        constructors = []
+        if java_constructors:
+            ctor_docs = docs.get_overload_set('<init>') if docs else None
+            constructors.append(OverloadSet(name='__init__', is_constructor=True, overloads=[
+                Overload.from_reflected_args(
+                    ReflectedArgs(ctor, False), ctor_for=cls,
+                    docs=ctor_docs, compact_for=compact_for,
+                )
+                for ctor in sorted(
+                    java_constructors,
+                    key=lambda ctor: [t.getName() for t in ctor.getParameterTypes()],
+                )
+            ]))
+
+        return Class(
+            name=cls.__name__.rpartition('$')[-1],
+            methods=methods,
+            properties=[
+                Property.from_beanproperty(beanproperty=bean_properties[name], name=name)
+                for name in sorted(bean_properties)
+            ],
+            constructors=constructors,
+            fields=[Field.from_java_field(field) for field in java_fields],
+            nested_classes=[
+                Class.from_java_class(nested_class, declared_only=declared_only, compact=compact)
+                for nested_class in sorted(nested_classes, key=lambda nested: nested.__name__)
+            ],
+            is_iterable=hasattr(cls, '__iter__'),
+            bases=[BasicType.from_type(base) for base in cls.__bases__],
+            docstring=(DocRef(docs.class_name) if compact else docs.comment) if docs else None,
+        )
+
+    @property
+    def requires_mask(self):
+        # type: () -> int
+        """The requirements of the class, computed once.
+
+        Members are expected not to change after extraction.
+        """
+        if self._requires_mask is None:
+            mask = TYPING_ITERATOR if self.is_iterable else 0
+            for member in self.methods:
+                mask |= member.requires_mask
+            for nested_class in self.nested_classes:
+                mask |= nested_class.requires_mask
+            for base in self.bases:
+                mask |= base.requires_mask
+            self._requires_mask = mask
+        return self._requires_mask
+
     @property
     def requires(self):
-        requirements = (
-            set()
-            .union(*(member.requires for member in self.methods))
-            .union(*(nested_class.requires for nested_class in self.nested_classes))
-            .union(*(base.requires for base in self.bases))
+        return set(get_requirements(self.requires_mask))
+
+    def add_fingerprint_parts(self, parts):
+        # type: (List[Any]) -> None
+        parts.append(self.name)
+        add_fingerprint_parts(parts, self.methods)
+        add_fingerprint_parts(parts, self.constructors)
+        add_fingerprint_parts(parts, self.properties)
+        add_fingerprint_parts(parts, self.fields)
+        add_fingerprint_parts(parts, self.nested_classes)
+        parts.append('iterable' if self.is_iterable else '')
+        parts.append(str(len(self.bases)))
+        parts.extend([base.proper_name for base in self.bases])
+        parts.extend(get_docstring_key(self.docstring))
+
+    @property
+    def fingerprint(self):
+        # type: () -> str
+        """A fingerprint of what the stub of the class is formatted from, computed once.
+
+        Only the names of types go into it, and docstrings left in the doc store
+        only by where they are, so it is much cheaper than the repr of the model.
+        Members are expected not to change after extraction.
+        """
+        if self._fingerprint is None:
+            parts = []  # type: List[Any]
+            self.add_fingerprint_parts(parts)
+            if str is bytes:
+                # Under Jython, names from Java are text, and docstrings are byte strings.
+                parts = [
+                    part if isinstance(part, bytes) else part.encode('utf8') for part in parts
+                ]
+            self._fingerprint = get_fingerprint('\0'.join(parts))
+        return self._fingerprint
+
+
+def get_package_members(package):
+    # type: (Any) -> Tuple[List[Tuple[str, type]], List[Any]]
+    """Split the members of a Java package into named classes and sub-packages."""
+    classes = []
+    packages = []
+    for name, attr_ in get_members(package).items():
+        if name == '__name__':
+            continue
+
+        typename = BasicType.from_type(type(attr_)).proper_name
+
+        if typename == 'javapackage':
+            packages.append(attr_)
+
+        elif typename == 'java.lang.Class':
+            classes.append(('{}.{}'.format(package.__name__, name), attr_))
+
+    return classes, packages
+
+
+@attr.s(frozen=True)
+class ExtractionOptions(object):
+    # Only extract the members classes declare, see `Class.from_class`.
+    declared_only = attr.ib(default=False)  # type: bool
+    # Extract classes through `java.lang.reflect`, see `Class.from_java_class`.
+    java_reflection = attr.ib(default=False)  # type: bool
+    # Build compact models, see `Overload.from_reflected_args`.
+    compact_model = attr.ib(default=False)  # type: bool
+    # Only extract the classes of the packages this accepts by name, see `sharding.ShardPlan`.
+    package_filter = attr.ib(default=None)  # type: Optional[Callable[[str], bool]]
+
+    def includes_package(self, package_name):
+        # type: (str) -> bool
+        return self.package_filter is None or self.package_filter(package_name)
+
+
+DEFAULT_EXTRACTION = ExtractionOptions()
+
+
+class ClassModelCache(object):
+    """Process-wide cache of the models of selected classes, needed again after the extraction.
+
+    Only the classes registered with `keep` are cached,
+    so packages can still be released once written.
+    Models are cached by class name and extraction options, as those change the model.
+    """
+
+    def __init__(self):
+        self._kept = set()  # type: set
+        self._models = {}  # type: Dict[Tuple[str, ExtractionOptions], Class]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(class_name, extraction):
+        # type: (str, ExtractionOptions) -> Tuple[str, ExtractionOptions]
+        return class_name, attr.evolve(extraction, package_filter=None)
+
+    def keep(self, class_names):
+        # type: (Iterable[str]) -> None
+        with self._lock:
+            self._kept.update(class_names)
+
+    def get(self, class_name, extraction):
+        # type: (str, ExtractionOptions) -> Optional[Class]
+        if class_name not in self._kept:
+            return None
+        with self._lock:
+            return self._models.get(self._get_key(class_name, extraction))
+
+    def put(self, class_name, extraction, model):
+        # type: (str, ExtractionOptions, Class) -> None
+        if class_name not in self._kept:
+            return
+        with self._lock:
+            self._models[self._get_key(class_name, extraction)] = model
+
+
+class_model_cache = ClassModelCache()
+
+
+class SharedOverloads(object):
+    """Process-wide table of inherited overloads.
+
+    Identical ones are shared by all the classes inheriting them.
+
+    Methods whose overloads are all inherited share their overload sets as well.
+    Only used for compact models,
+    whose docstrings reference the docs of the class declaring the method.
+    """
+
+    def __init__(self):
+        self._overloads = {}  # type: Dict[Tuple, Overload]
+        self._overload_sets = {}  # type: Dict[Tuple, OverloadSet]
+        self._lock = threading.Lock()
+
+    def share(self, overload):
+        # type: (Overload) -> Overload
+        with self._lock:
+            return self._overloads.setdefault(overload.key, overload)
+
+    def share_set(self, overload_set):
+        # type: (OverloadSet) -> OverloadSet
+        """Share a set of shared overloads.
+
+        Those are kept alive by the table, so they are keyed by identity.
+        """
+        key = (
+            overload_set.name, overload_set.is_constructor, tuple(map(id, overload_set.overloads)),
         )
-        if self.is_iterable:
-            requirements.add(('typing', 'Iterator'))
+        with self._lock:
+            return self._overload_sets.setdefault(key, overload_set)
+
+    def clear(self):
+        with self._lock:
+            self._overloads.clear()
+            self._overload_sets.clear()
+
+    def __len__(self):
+        return len(self._overloads)
+
+
+shared_overloads = SharedOverloads()
+
+
+def extract_class(cls, class_name, extraction=DEFAULT_EXTRACTION, cache=None):
+    # type: (type, str, ExtractionOptions, Any) -> Class
+    """Extract a class, unless it is in `class_model_cache` or in the persistent `cache`.
+
+    `cache` is an `extraction_cache.ExtractionCache`,
+    which also records the classes that were extracted.
+    """
+    model = class_model_cache.get(class_name, extraction)
+    if model is not None:
+        return model
+
+    if cache is not None:
+        model = cache.get(class_name)
+
+    if model is None:
+        with profiler.span(class_name, profiler.CLASS, package=class_name.rpartition('.')[0]):
+            from_class = Class.from_java_class if extraction.java_reflection else Class.from_class
+            model = from_class(
+                cls, docs=get_class_doc(class_name), declared_only=extraction.declared_only,
+                compact=extraction.compact_model,
+            )
+            if extraction.compact_model:
+                # Fingerprint the docstrings left in the doc store while their docs are loaded.
+                model.fingerprint
+
+        if cache is not None:
+            cache.record(class_name, cls, model)
+
+    class_model_cache.put(class_name, extraction, model)
+    return model
+
+
+class ClassExtractionTask(JavaCallable):
+    def __init__(self, cls, class_name, extraction=DEFAULT_EXTRACTION, cache=None):
+        # type: (type, str, ExtractionOptions, Any) -> None
+        self.cls = cls
+        self.class_name = class_name
+        self.extraction = extraction
+        self.cache = cache
 
-        return requirements
+    def call(self):
+        return extract_class(self.cls, self.class_name, self.extraction, self.cache)
+
+
+def get_default_worker_count():
+    # type: () -> int
+    return java.lang.Runtime.getRuntime().availableProcessors()
 
 
 @attr.s
@@ -358,27 +958,202 @@ class Package(object):
     packages = attr.ib()  # type: List[Package]
 
     @staticmethod
-    def from_package(package):
-        packages = []
-        classes = []
-        for name, attr_ in get_members(package).iteritems():
-            if name == '__name__':
-                continue
+    def from_package(package, workers=1, extraction=DEFAULT_EXTRACTION, cache=None):
+        # type: (Any, int, ExtractionOptions, Any) -> Package
+        """Extract a package and all of its sub-packages.
+
+        With more than one worker, classes are extracted on a thread pool,
+        as Jython has no GIL. The results are put in the same places a serial run puts them.
+
+        With a persistent `cache`, its classes that were not loaded are added as well,
+        see `add_cached`.
+        """
+        if workers <= 1:
+            def _extract(cls, class_name):
+                return extract_class(cls, class_name, extraction, cache)
 
-            typename = BasicType.from_type(type(attr_)).proper_name
+            root = Package._from_package(package, _extract, extraction)
+        else:
+            executor = java.util.concurrent.Executors.newFixedThreadPool(workers)
+            try:
+                def _submit(cls, class_name):
+                    return executor.submit(ClassExtractionTask(cls, class_name, extraction, cache))
+
+                root = Package._from_package(package, _submit, extraction)
+                for subpackage in root.iter_packages():
+                    subpackage.classes = [future.get() for future in subpackage.classes]
+            finally:
+                executor.shutdownNow()
+
+        if cache is not None:
+            root.add_cached(cache)
+        return root
+
+    @staticmethod
+    def from_cache(name, cache):
+        # type: (str, Any) -> Package
+        """Build a package and its sub-packages from the classes left in a persistent cache."""
+        return Package(
+            name=name,
+            classes=cache.pop_classes(name),
+            packages=[
+                Package.from_cache(subpackage_name, cache)
+                for subpackage_name in cache.get_subpackage_names(name)
+            ],
+        )
+
+    @staticmethod
+    def iter_from_cache(name, cache):
+        # type: (str, Any) -> Iterator[Package]
+        """Build a package and its sub-packages from a persistent cache, one at a time.
+
+        Like in `iter_from_package`, each package is yielded with its classes,
+        and with name-only entries for its sub-packages.
+        """
+        stack = [name]
+        while stack:
+            current = stack.pop()
+            subpackage_names = cache.get_subpackage_names(current)
+            stack.extend(subpackage_names)
+            yield Package(
+                name=current,
+                classes=cache.pop_classes(current),
+                packages=[
+                    Package(name=subpackage_name, classes=[], packages=[])
+                    for subpackage_name in subpackage_names
+                ],
+            )
 
-            if typename == 'javapackage':
-                packages.append(Package.from_package(attr_))
+    def add_cached(self, cache):
+        # type: (Any) -> None
+        """Add the classes left in a persistent cache to this package and its sub-packages.
+
+        Those are the cached classes that were not loaded, so were not found in the package members.
+        """
+        for package in list(self.iter_packages()):
+            package.classes.extend(cache.pop_classes(package.name))
+            names = set(subpackage.name for subpackage in package.packages)
+            package.packages.extend(
+                Package.from_cache(subpackage_name, cache)
+                for subpackage_name in cache.get_subpackage_names(package.name)
+                if subpackage_name not in names
+            )
+
+    @staticmethod
+    def _from_package(package, extract, extraction):
+        # type: (Any, Callable[[type, str], Any], ExtractionOptions) -> Package
+        class_members, subpackages = get_package_members(package)
+        if not extraction.includes_package(package.__name__):
+            class_members = []
+
+        return Package(
+            name=package.__name__,
+            classes=[extract(cls, class_name) for class_name, cls in class_members],
+            packages=[
+                Package._from_package(subpackage, extract, extraction)
+                for subpackage in subpackages
+            ],
+        )
 
-            elif typename == 'java.lang.Class':
-                try:
-                    docs = ClassDoc('{}.{}'.format(package.__name__, name))
-                except KeyError:
-                    docs = None
-                classes.append(Class.from_class(attr_, docs=docs))
+    @staticmethod
+    def iter_from_package(
+        package, workers=1, lookahead=8, extraction=DEFAULT_EXTRACTION, cache=None,
+    ):
+        # type: (Any, int, int, ExtractionOptions, Any) -> Iterator[Package]
+        """Extract a package and all of its sub-packages, one package at a time.
+
+        Each package is yielded with its classes,
+        and with name-only entries for its sub-packages.
+        The classes and their docs are released once the consumer is done with the package,
+        so memory scales with the largest package instead of the whole API.
+
+        With more than one worker, the classes of up to `lookahead` packages
+        are extracted ahead of the consumer, on a thread pool.
+
+        With a persistent `cache`, its classes that were not loaded are yielded as well,
+        the sub-packages that only exist in the cache after all others.
+        Cached classes are only loaded from the cache as their package is yielded.
+        """
+        executor = None
+        window = 1
+        if workers > 1:
+            executor = java.util.concurrent.Executors.newFixedThreadPool(workers)
+            window = max(lookahead, 1)
+
+        stack = [package]
+        pending = deque()
+        cached_package_names = []  # type: List[str]
+        try:
+            while stack or pending:
+                while stack and len(pending) < window:
+                    current = stack.pop()
+                    class_members, subpackages = get_package_members(current)
+                    stack.extend(subpackages)
+                    if not extraction.includes_package(current.__name__):
+                        class_members = []
+
+                    futures = None
+                    if executor is not None:
+                        futures = [
+                            executor.submit(ClassExtractionTask(cls, class_name, extraction, cache))
+                            for class_name, cls in class_members
+                        ]
+                    pending.append((current, class_members, subpackages, futures))
+
+                current, class_members, subpackages, futures = pending.popleft()
+                if futures is None:
+                    classes = [
+                        extract_class(cls, class_name, extraction, cache)
+                        for class_name, cls in class_members
+                    ]
+                else:
+                    classes = [future.get() for future in futures]
+
+                subpackage_names = [subpackage.__name__ for subpackage in subpackages]
+                if cache is not None:
+                    classes.extend(cache.pop_classes(current.__name__))
+                    for subpackage_name in cache.get_subpackage_names(current.__name__):
+                        if subpackage_name not in subpackage_names:
+                            subpackage_names.append(subpackage_name)
+                            cached_package_names.append(subpackage_name)
+
+                yield Package(
+                    name=current.__name__,
+                    classes=classes,
+                    packages=[
+                        Package(name=name, classes=[], packages=[])
+                        for name in subpackage_names
+                    ],
+                )
+
+                del classes
+                for class_name, _cls in class_members:
+                    class_doc_cache.discard(class_name)
+
+            for cached_package_name in cached_package_names:
+                for cached_package in Package.iter_from_cache(cached_package_name, cache):
+                    yield cached_package
+        finally:
+            if executor is not None:
+                executor.shutdownNow()
+
+    def iter_packages(self):
+        # type: () -> Iterator[Package]
+        """Iterate over this package and all of its sub-packages."""
+        stack = [self]
+        while stack:
+            package = stack.pop()
+            yield package
+            stack.extend(package.packages)
 
-        return Package(name=package.__name__, classes=classes, packages=packages)
+    @property
+    def requires_mask(self):
+        # type: () -> int
+        mask = 0
+        for cls in self.classes:
+            mask |= cls.requires_mask
+        return mask
 
     @property
     def requires(self):
-        return set().union(*(cls.requires for cls in self.classes))
+        return set(get_requirements(self.requires_mask))
@@ -1,9 +1,55 @@
 from __future__ import print_function
 
 import os
-from typing import Iterable, List, Tuple
-
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Tuple, Optional, Set, Union
+
+import basic_type
+import profiler
+from helper import DocRef, resolve_docstring
+from requirements import get_requirements
+from manifest import Manifest, get_fingerprint, get_module_fingerprint
+from stub_writer import ImportIndex, StubWriter
 from type_extractor import OverloadSet, Overload, Package, Class
+from version import PYI_VERSION
+
+
+# Stub profiles, from the largest stubs to the smallest:
+# all docs, the first sentence of every doc, or no docs at all.
+FULL = 'full'
+SUMMARY = 'summary'
+SIGNATURES = 'signatures'
+STUB_PROFILES = (FULL, SUMMARY, SIGNATURES)
+
+# As in javadoc, the first sentence ends at a period followed by whitespace,
+# or at a blank line or a block tag.
+_first_sentence_end = re.compile(r'\.(?=\s|$)|\n\s*\n|(?:^|\n)\s*@')
+
+
+def get_summary(docstring):
+    # type: (str) -> str
+    match = _first_sentence_end.search(docstring)
+    if match is None:
+        return docstring.strip()
+
+    end = match.end() if match.group() == '.' else match.start()
+    return docstring[:end].strip()
+
+
+def get_docstring(docstring, stub_profile=FULL):
+    # type: (Union[str, DocRef, None], str) -> Optional[str]
+    """The docstring of a stub, unless it is left out.
+
+    It is read from the doc store if the model left it there.
+    """
+    if stub_profile != SIGNATURES:
+        docstring = resolve_docstring(docstring)
+    if not docstring or stub_profile == FULL:
+        return docstring
+    if stub_profile == SUMMARY:
+        return get_summary(docstring)
+    return ''
 
 
 def indent(text):
@@ -13,8 +59,8 @@ def indent(text):
     return ''.join(prefixed_lines)
 
 
-def format_overload_set(overload_set, bound=False):
-    # type: (OverloadSet, bool) -> Iterable[str]
+def format_overload_set(overload_set, bound=False, stub_profile=FULL):
+    # type: (OverloadSet, bool, str) -> Iterable[str]
 
     def _get_format(is_ctor, has_docstring):
         ending = ' ...'
@@ -52,13 +98,14 @@ def format_overload_set(overload_set, bound=False):
         )
 
     for overload in overload_set.overloads:
-        def_format = _get_format(overload_set.is_constructor, overload.docstring)
+        docstring = get_docstring(overload.docstring, stub_profile)
+        def_format = _get_format(overload_set.is_constructor, docstring)
         overload_code = def_format.format(
             optional_self=get_optional_self(overload),
             name=overload_set.name,
             args=get_arguments(overload),
             return_type=overload.return_type.proper_name,
-            docstring=indent(overload.docstring),
+            docstring=indent(docstring),
         )
 
         if overload.is_static and not overload_set.is_constructor and not bound:
@@ -79,127 +126,197 @@ def format_imports(imports):
             yield 'from {} import {}'.format(module, member)
 
 
-def format_pyi_class(cls, is_nested=False):
-    # type: (Class, bool) -> str
+# Import blocks by requirements mask. Classes of a package tend to share their requirements.
+_import_blocks = {}  # type: Dict[int, str]
+
+
+def format_import_block(requires_mask):
+    # type: (int) -> str
+    import_block = _import_blocks.get(requires_mask)
+    if import_block is None:
+        import_block = '\n'.join(sorted(format_imports(get_requirements(requires_mask))))
+        _import_blocks[requires_mask] = import_block
+    return import_block
 
-    def _format_imports():
-        if is_nested:
+
+class PyiWriter(object):
+    """Writes the chunks of a stub to a file-like `sink`, each indented by a number of levels.
+
+    Lines are indented as by `indent`, so only lines with some text get a prefix.
+    Every chunk is expected to start at the beginning of a line.
+    """
+
+    def __init__(self, sink):
+        self._write = sink.write
+
+    def write(self, text, level=0):
+        # type: (str, int) -> None
+        if not level:
+            self._write(text)
             return
 
-        for formatted_import in format_imports(cls.requires):
-            yield formatted_import
+        prefix = '    ' * level
+        for line in text.splitlines(True):
+            self._write(prefix + line if line.strip() else line)
+
+    def write_separated(self, chunks, separator, level=0):
+        # type: (Iterable[str], str, int) -> None
+        for index, chunk in enumerate(chunks):
+            if index:
+                self._write(separator)
+            self.write(chunk, level)
+
+
+class TextBuffer(object):
+    """A sink that keeps the written chunks, and joins them once."""
+
+    def __init__(self):
+        self._chunks = []  # type: List[str]
+        self.write = self._chunks.append
+
+    def getvalue(self):
+        # type: () -> str
+        return ''.join(self._chunks)
+
+
+def by_name(member):
+    return member.name
+
 
-    def _format_methods():
-        for overload_set in sorted(cls.methods):
-            for fmt in format_overload_set(overload_set):
-                yield fmt
+def _iter_overloads(overload_sets, stub_profile):
+    # type: (List[OverloadSet], str) -> Iterable[str]
+    for overload_set in sorted(overload_sets, key=by_name):
+        for fmt in format_overload_set(overload_set, stub_profile=stub_profile):
+            yield fmt
 
-    def _format_ctors():
-        for overload_set in sorted(cls.constructors):
-            for fmt in format_overload_set(overload_set):
-                yield fmt
 
-    def _format_properties():
-        for prop in sorted(cls.properties):
-            getter = (
-                '    @property\n'
-                '    def {name}(self) -> {getter_type}: ...{comment}'
+def _iter_properties(cls):
+    # type: (Class) -> Iterable[str]
+    for prop in sorted(cls.properties, key=by_name):
+        yield (
+            '    @property\n'
+            '    def {name}(self) -> {getter_type}: ...{comment}'
+        ).format(
+            name=prop.name,
+            getter_type=prop.getter_type.proper_name if prop.has_getter else 'None',
+            comment='' if prop.has_getter else '  # No getter available.',
+        )
+
+        if prop.has_setter:
+            yield (
+                '    @{name}.setter\n'
+                '    def {name}(self, value: {setter_type}) -> None: ...'
             ).format(
                 name=prop.name,
-                getter_type=prop.getter_type.proper_name if prop.has_getter else 'None',
-                comment='' if prop.has_getter else '  # No getter available.',
+                setter_type=prop.setter_type.proper_name,
             )
 
-            yield getter
 
-            if prop.has_setter:
-                setter = (
-                    '    @{name}.setter\n'
-                    '    def {name}(self, value: {setter_type}) -> None: ...'
-                ).format(
-                    name=prop.name,
-                    setter_type=prop.setter_type.proper_name,
-                )
+def _iter_fields(cls):
+    # type: (Class) -> Iterable[str]
+    for field in sorted(cls.fields, key=by_name):
+        declaration = '    {name}: {type}'.format(
+            name=field.name, type=field.my_type.proper_name,
+        )
+        if field.has_value:
+            declaration += ' = {}'.format(field.value_repr)
+        yield declaration
+
+
+def _iter_iterable(cls):
+    # type: (Class) -> Iterable[str]
+    if cls.is_iterable:
+        iter_obj = None
+        for method in cls.methods:
+            if method.name == 'next':
+                iter_obj = method.overloads[0].return_type.proper_name
+                break
+        if iter_obj is not None:
+            yield '    def __iter__(self) -> Iterator[{}]: ...'.format(iter_obj)
+        else:
+            yield '    def __iter__(self): ...'
 
-                yield setter
 
-    def _format_fields():
-        for field in sorted(cls.fields):
-            declaration = '    {name}: {type}'.format(
-                name=field.name, type=field.my_type.proper_name,
-            )
-            if field.has_value:
-                assignment = ' = {}'.format(field.value_repr)
-                declaration += assignment
-            yield declaration
-
-    def _format_nested_classes():
-        for nested_class in cls.nested_classes:
-            nested_class_text = format_pyi_class(
-                nested_class,
-                is_nested=True,
-            )
-            indented_nested_class_text = indent(nested_class_text)
-            yield indented_nested_class_text
-
-    def _format_iterable():
-        if cls.is_iterable:
-            iter_obj = None
-            for method in cls.methods:
-                if method.name == 'next':
-                    iter_obj = method.overloads[0].return_type.proper_name
-                    break
-            if iter_obj is not None:
-                yield '    def __iter__(self) -> Iterator[{}]: ...'.format(iter_obj)
-            else:
-                yield '    def __iter__(self): ...'
+def write_pyi_class(writer, cls, level=0, is_nested=False, stub_profile=FULL):
+    # type: (PyiWriter, Class, int, bool, str) -> None
+    """Write the stub of `cls`, with nested classes written in place one level deeper."""
+    if not is_nested:
+        writer.write(format_import_block(cls.requires_mask))
+    writer.write('\n\n\n')
 
     bases = ', '.join(base.proper_name for base in cls.bases)
-    class_docs = ''
-    if cls.docstring:
-        class_docs = '    """\n{}\n    """\n\n'.format(indent(cls.docstring))
-
-    return (
-        '{imports}\n\n\n'
-        '{class_header}\n'
-        '{class_docs}'
-        '{fields}\n\n'
-        '{nested_classes}\n\n'
-        '{ctors}\n\n'
-        '{iterable}\n\n'
-        '{methods}\n\n'
-        '{properties}'
-    ).format(
-        imports='\n'.join(sorted(_format_imports())),
-        class_header='class {name}({bases}):'.format(name=cls.name, bases=bases),
-        ctors=indent('\n\n'.join(_format_ctors())),
-        properties='\n\n'.join(_format_properties()),
-        methods=indent('\n\n'.join(_format_methods())),
-        fields='\n'.join(_format_fields()),
-        nested_classes='\n\n'.join(_format_nested_classes()),
-        iterable='\n\n'.join(_format_iterable()),
-        class_docs=class_docs,
-    )
+    writer.write('class {name}({bases}):\n'.format(name=cls.name, bases=bases), level)
+    docstring = get_docstring(cls.docstring, stub_profile)
+    if docstring:
+        writer.write('    """\n', level)
+        writer.write(docstring, level + 1)
+        writer.write('\n    """\n\n', level)
+
+    writer.write_separated(_iter_fields(cls), '\n', level)
+    writer.write('\n\n')
+
+    for index, nested_class in enumerate(cls.nested_classes):
+        if index:
+            writer.write('\n\n')
+        write_pyi_class(writer, nested_class, level + 1, is_nested=True, stub_profile=stub_profile)
+    writer.write('\n\n')
+
+    writer.write_separated(_iter_overloads(cls.constructors, stub_profile), '\n\n', level + 1)
+    writer.write('\n\n')
+    writer.write_separated(_iter_iterable(cls), '\n\n', level)
+    writer.write('\n\n')
+    writer.write_separated(_iter_overloads(cls.methods, stub_profile), '\n\n', level + 1)
+    writer.write('\n\n')
+    writer.write_separated(_iter_properties(cls), '\n\n', level)
+
+
+def format_pyi_class(cls, is_nested=False, stub_profile=FULL):
+    # type: (Class, bool, str) -> str
+    buffer = TextBuffer()
+    write_pyi_class(PyiWriter(buffer), cls, is_nested=is_nested, stub_profile=stub_profile)
+    return buffer.getvalue()
+
+
+def get_format_key(stub_profile=FULL):
+    # type: (str) -> str
+    """Fingerprint everything but the model that affects the generated text."""
+    return get_fingerprint(''.join([
+        PYI_VERSION,
+        stub_profile,
+        get_module_fingerprint(sys.modules[__name__]),
+        get_module_fingerprint(basic_type),
+    ]))
+
+
+def get_class_path(package_path, cls):
+    # type: (str, Class) -> str
+    return '{}.pyi'.format(os.path.join(package_path, cls.name))
+
+
+def write_package_classes(writer, package_path, package, manifest=None, stub_profile=FULL):
+    # type: (StubWriter, str, Package, Optional[Manifest], str) -> None
+    for cls in package.classes:
+        relative_path = get_class_path(package_path, cls)
 
+        if manifest is not None:
+            model_fingerprint = cls.fingerprint
+            if manifest.is_unchanged(relative_path, model_fingerprint):
+                continue
 
-def write_package_classes(root, package_path, package):
-    # type: (str, str, Package) -> None
-    for cls in package.classes:
-        class_path = '{}.pyi'.format(os.path.join(root, package_path, cls.name))
-        pyi_content = format_pyi_class(cls)
-        with open(class_path, 'w') as f:
-            f.write(pyi_content)
+        pyi_content = format_pyi_class(cls, stub_profile=stub_profile)
 
+        if (
+            manifest is not None
+            and not manifest.record(relative_path, model_fingerprint, pyi_content)
+        ):
+            continue
 
-def update_imports(init_path, package):
-    # type: (str, Package) -> None
-    imports = set()
+        writer.write(relative_path, pyi_content)
 
-    if os.path.exists(init_path):
-        with open(init_path, 'r') as f:
-            imports.update(f.read().splitlines())
 
-    imports.update(
+def get_package_imports(package):
+    # type: (Package) -> Set[str]
+    imports = set(
         'from .{0} import {0} as {0}'.format(cls.name)
         for cls in package.classes
     )
@@ -207,9 +324,19 @@ def update_imports(init_path, package):
         'from . import {0} as {0}'.format(package.name.rpartition('.')[-1])
         for package in package.packages
     )
+    return imports
+
+
+def write_imports(writer, import_index, manifest=None):
+    # type: (StubWriter, ImportIndex, Optional[Manifest]) -> None
+    for package_path, imports in import_index.items():
+        relative_path = os.path.join(package_path, '__init__.pyi')
+        init_content = ImportIndex.format(imports)
 
-    with open(init_path, 'w') as f:
-        f.write('\n'.join(sorted(imports)))
+        if manifest is not None and not manifest.record(relative_path, None, init_content):
+            continue
+
+        writer.write(relative_path, init_content)
 
 
 def get_package_path(package):
@@ -217,15 +344,6 @@ def get_package_path(package):
     return package.name.replace('.', '/')
 
 
-def create_package_directories(root, packages):
-    # type: (str, List[Package]) -> None
-    for package in packages:
-        package_path = get_package_path(package)
-        path = os.path.join(root, package_path)
-        if not os.path.exists(path):
-            os.makedirs(path)
-
-
 def get_all_packages(preparsed_packages):
     # type: (Tuple[Package, ...]) -> List[Package]
     """Get all packages, including nested ones"""
@@ -240,15 +358,38 @@ def get_all_packages(preparsed_packages):
     return packages
 
 
-def create_type_hints(root, *packages):
-    # type: (str, *Package) -> None
-    all_packages = get_all_packages(packages)
+def create_type_hints(root, *packages, **kwargs):
+    # type: (str, *Package, **str) -> None
+    stub_profile = kwargs.get('stub_profile', FULL)
+    write_type_hints(root, get_all_packages(packages), stub_profile=stub_profile)
+
+
+def write_packages(writer, packages, manifest=None, stub_profile=FULL):
+    # type: (Any, Iterable[Package], Optional[Manifest], str) -> None
+    """Format and write the classes of each package as soon as it is available.
+
+    Only the `__init__.pyi` imports are kept until the end,
+    so `packages` can be a stream of packages that are released once written.
+    `writer` is a `StubWriter`, or a `WheelWriter`.
+    """
+    import_index = ImportIndex()
+
+    for package in packages:
+        with profiler.span(package.name, profiler.PACKAGE):
+            package_path = get_package_path(package)
+            import_index.add(package_path, get_package_imports(package))
+
+            write_package_classes(writer, package_path, package, manifest, stub_profile)
+
+    write_imports(writer, import_index, manifest)
+
 
-    create_package_directories(root, all_packages)
+def write_type_hints(root, packages, stub_profile=FULL):
+    # type: (str, Iterable[Package], str) -> None
+    """Write the stubs of `packages` under `root`, only rewriting the files that changed."""
+    manifest = Manifest(root, get_format_key(stub_profile))
 
-    for package in all_packages:
-        package_path = get_package_path(package)
-        init_path = os.path.join(root, package_path, '__init__.pyi')
-        update_imports(init_path, package)
+    with StubWriter(root) as writer:
+        write_packages(writer, packages, manifest, stub_profile)
 
-        write_package_classes(root, package_path, package)
+    manifest.save()
@@ -0,0 +1,152 @@
+"""The wheel output stage: writes the stubs straight into a PEP 561 stub-only wheel.
+
+A drop-in for `StubWriter`, so the formatter's output goes into the archive as it is produced,
+without a `.pyi` tree and a `setup.py` to install it from.
+"""
+from __future__ import print_function
+
+import base64
+import hashlib
+import io
+import os
+import zipfile
+
+from typing import Any, List, Optional, Tuple
+
+from generate_stub_package import AUTHOR, PACKAGE_NAME, URL
+from helper import ensure_directory
+from version import PYI_VERSION
+
+# A fixed timestamp, so that the same stubs make the same wheel.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+README_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'README.md')
+
+
+def get_record_hash(data):
+    # type: (bytes) -> str
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=')
+    return 'sha256=' + digest.decode('ascii')
+
+
+def get_package_version(ghidra_version, stub_version='DEV'):
+    # type: (str, str) -> str
+    """The version `setup.py` would give the package.
+
+    `DEV` is normalized to a PEP 440 development release.
+    """
+    if stub_version.upper() == 'DEV':
+        return '{}.dev0'.format(ghidra_version)
+    return '{}.{}'.format(ghidra_version, stub_version)
+
+
+def get_wheel_filename(version):
+    # type: (str) -> str
+    return '{}-{}-py3-none-any.whl'.format(
+        PACKAGE_NAME.replace('-', '_'), version.replace('-', '_'),
+    )
+
+
+class WheelWriter(object):
+    """Writes files into a wheel of the stub package, in `directory`.
+
+    Files under `ghidra/` go to the `ghidra-stubs` package,
+    and their RECORD entries are computed as they are written.
+    The metadata and the RECORD are written on `close`.
+    If writing fails, the incomplete wheel is removed.
+    """
+
+    def __init__(self, directory, ghidra_version, stub_version='DEV', readme_path=README_PATH):
+        # type: (str, str, str, Optional[str]) -> None
+        self.version = get_package_version(ghidra_version, stub_version)
+        self.path = os.path.join(ensure_directory(directory), get_wheel_filename(self.version))
+        self.readme_path = readme_path
+        self.file_count = 0
+        self.byte_count = 0
+        self._records = []  # type: List[Tuple[str, str, int]]
+        self._zip = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED)
+
+    @property
+    def dist_info(self):
+        # type: () -> str
+        return '{}-{}.dist-info'.format(
+            PACKAGE_NAME.replace('-', '_'), self.version.replace('-', '_'),
+        )
+
+    def _write_entry(self, archive_path, data):
+        # type: (str, bytes) -> None
+        info = zipfile.ZipInfo(archive_path, date_time=ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+
+    def _add(self, archive_path, content):
+        # type: (str, Any) -> int
+        if not isinstance(content, bytes):
+            content = content.encode('utf8')
+
+        self._write_entry(archive_path, content)
+        self._records.append((archive_path, get_record_hash(content), len(content)))
+        return len(content)
+
+    def write_file(self, relative_path, path):
+        # type: (str, str) -> None
+        with open(path, 'rb') as f:
+            self.write(relative_path, f.read())
+
+    def write(self, relative_path, content):
+        # type: (str, Any) -> None
+        package, _sep, path = relative_path.replace(os.sep, '/').partition('/')
+        if package != 'ghidra':
+            raise ValueError('{} is not part of the ghidra package'.format(relative_path))
+
+        self.byte_count += self._add('{}/{}'.format(PACKAGE_NAME, path), content)
+        self.file_count += 1
+
+    def _get_metadata(self):
+        # type: () -> str
+        metadata = (
+            'Metadata-Version: 2.1\n'
+            'Name: {name}\n'
+            'Version: {version}\n'
+            'Home-page: {url}\n'
+            'Author: {author}\n'
+        ).format(name=PACKAGE_NAME, version=self.version, url=URL, author=AUTHOR)
+
+        if self.readme_path is not None and os.path.exists(self.readme_path):
+            with io.open(self.readme_path, encoding='utf8') as f:
+                metadata += 'Description-Content-Type: text/markdown\n\n' + f.read()
+        return metadata
+
+    def _write_metadata(self):
+        self._add(self.dist_info + '/METADATA', self._get_metadata())
+        self._add(self.dist_info + '/WHEEL', (
+            'Wheel-Version: 1.0\n'
+            'Generator: ghidra-pyi-generator ({})\n'
+            'Root-Is-Purelib: true\n'
+            'Tag: py3-none-any\n'
+        ).format(PYI_VERSION))
+        self._add(self.dist_info + '/top_level.txt', PACKAGE_NAME + '\n')
+
+        record_path = self.dist_info + '/RECORD'
+        record = ''.join(
+            '{},{},{}\n'.format(path, record_hash, size)
+            for path, record_hash, size in self._records
+        ) + '{},,\n'.format(record_path)
+        self._write_entry(record_path, record.encode('utf8'))
+
+    def close(self):
+        self._write_metadata()
+        self._zip.close()
+
+    def abort(self):
+        self._zip.close()
+        os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()